@@ -1,7 +1,7 @@
 from importlib.metadata import version
 
-from .dataset import Dataset
+from .dataset import Dataset, DatasetWriter
 
 __version__ = version(__package__ or __name__)
 
-__all__ = ["Dataset", "__version__"]
+__all__ = ["Dataset", "DatasetWriter", "__version__"]
@@ -0,0 +1,385 @@
+import fcntl
+import math
+import os
+import struct
+import sys
+import threading
+from collections import deque
+from collections.abc import Callable, Generator, Hashable, Iterator, Sequence
+from contextlib import contextmanager, suppress
+from pathlib import Path
+from typing import IO, Any, NamedTuple, override
+
+import numpy as np
+import polars as pl
+import torch
+from cachetools import LRUCache
+from structlog import get_logger
+from torch import Tensor
+
+from rbyte.config import (
+    SampleCacheConfig,
+    SourceCacheConfig,
+    SourceCacheWeight,
+    TensorCacheConfig,
+)
+from rbyte.types import ManagedTensorSource, TensorSource
+from rbyte.utils import temporary_path
+
+__all__ = [
+    "CachedSource",
+    "SampleCache",
+    "SourceCache",
+    "SourceCacheInfo",
+    "TensorCache",
+    "TensorCacheInfo",
+]
+
+logger = get_logger(__name__)
+
+# of `maxsize`, that a full `TensorCache` evicts down to, amortizing its scans
+_EVICT_TO = 0.9
+
+
+class SourceCacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    evictions: int
+    maxsize: float
+    currsize: float
+
+
+class CachedSource:
+    """A `TensorSource` held by a `SourceCache`, with a lock serializing its reads.
+
+    Readers pin it, so that once evicted it is only closed after the last of them
+    unpins it.
+    """
+
+    __slots__ = (
+        "_closed",
+        "_evicted",
+        "_pins",
+        "_state_lock",
+        "cached",
+        "lock",
+        "source",
+    )
+
+    def __init__(self, source: TensorSource) -> None:
+        self.source = source
+        self.lock = threading.Lock()
+        # set once inserted, sources too large for the cache never are
+        self.cached = False
+        self._state_lock = threading.Lock()
+        self._pins = 0
+        self._evicted = self._closed = False
+
+    def pin(self) -> bool:
+        # `False` if already closed by eviction
+        with self._state_lock:
+            if self._closed:
+                return False
+
+            self._pins += 1
+
+            return True
+
+    def unpin(self) -> None:
+        with self._state_lock:
+            self._pins -= 1
+            close = self._evicted and not (self._closed or self._pins)
+            self._closed |= close
+
+        if close:
+            self._close()
+
+    def read(self, indexes: Sequence[Any]) -> Tensor:
+        # sources are not thread-safe
+        with self.lock:
+            return self.source[indexes]
+
+    def evict(self) -> None:
+        # closes now, or once the last reader unpins it
+        with self._state_lock:
+            self._evicted = True
+            close = not (self._closed or self._pins)
+            self._closed |= close
+
+        if close:
+            self._close()
+
+    def _close(self) -> None:
+        with self.lock:
+            if isinstance(self.source, ManagedTensorSource):
+                self.source.close()
+
+
+class SourceCache(LRUCache[Hashable, CachedSource]):
+    """An LRU cache of `TensorSource`s, closing them after eviction.
+
+    Evicted sources are only closed by `close_evicted`, which must be called without
+    holding the cache's lock, or by the last reader to unpin them.
+    """
+
+    def __init__(self, config: SourceCacheConfig) -> None:
+        super().__init__(
+            maxsize=math.inf if config.maxsize is None else config.maxsize,
+            getsizeof=self._getsizeof(config.weight),
+        )
+
+        self._evictions = 0
+        self._evicted: deque[CachedSource] = deque()
+
+    @property
+    def evictions(self) -> int:
+        return self._evictions
+
+    @override
+    def __setitem__(self, key: Hashable, value: CachedSource) -> None:
+        # `cachedmethod` silently returns sources too large to be inserted
+        try:
+            super().__setitem__(key, value)
+        except ValueError:
+            logger.debug("source too large to cache", key=key)
+            raise
+
+        value.cached = True
+
+    @override
+    def setdefault(
+        self, key: Hashable, default: CachedSource | None = None
+    ) -> CachedSource:
+        # of sources opened by concurrent misses, all but the cached one are closed
+        value = super().setdefault(key, default)
+        if default is not None and value is not default:
+            self._evicted.append(default)
+
+        return value
+
+    @override
+    def popitem(self) -> tuple[Hashable, CachedSource]:
+        key, source = super().popitem()
+        self._evictions += 1
+        self._evicted.append(source)
+        logger.debug("evicting source", key=key)
+
+        return key, source
+
+    def close_evicted(self) -> None:
+        while True:
+            try:
+                source = self._evicted.popleft()
+            except IndexError:
+                return
+
+            source.evict()
+
+    @staticmethod
+    def _getsizeof(weight: SourceCacheWeight) -> Callable[[CachedSource], int] | None:
+        match weight:
+            case SourceCacheWeight.count:
+                return None
+
+            case SourceCacheWeight.nbytes:
+                return lambda cached: (
+                    source.resources.nbytes
+                    if isinstance(source := cached.source, ManagedTensorSource)
+                    else sys.getsizeof(source)
+                )
+
+            case SourceCacheWeight.handles:
+                # assume a single handle for sources not reporting their resources
+                return lambda cached: (
+                    source.resources.handles
+                    if isinstance(source := cached.source, ManagedTensorSource)
+                    else 1
+                )
+
+
+class TensorCacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+
+class TensorCache:
+    """A byte-bounded cache of decoded `TensorSource` outputs.
+
+    Entries are stored as one `.npy` file per (namespace, index) under `path`, so
+    pointing it at a `tmpfs` (e.g. `/dev/shm`) or local NVMe directory shares a
+    single copy between all dataloader workers on a node and across epochs. Their
+    total size is kept in a counter file next to them, shared by all processes, and
+    the least recently used entries are evicted to make room for new ones.
+    """
+
+    NBYTES = ".nbytes"
+
+    def __init__(self, config: TensorCacheConfig) -> None:
+        self._path: Path = config.path
+        self._path.mkdir(parents=True, exist_ok=True)
+        self._maxsize = config.maxsize
+        self._hits = self._misses = 0
+        self._lock = threading.Lock()
+
+        # only the first process to use a directory scans it
+        with self._locked_counter("a+b") as f:
+            if not f.seek(0, os.SEEK_END):
+                f.write(struct.pack("<q", sum(size for _, size, _ in self._entries())))
+
+    def info(self) -> TensorCacheInfo:
+        with self._locked_counter("rb") as f:
+            (currsize,) = struct.unpack("<q", f.read(8))
+
+        with self._lock:
+            return TensorCacheInfo(
+                hits=self._hits,
+                misses=self._misses,
+                maxsize=self._maxsize,
+                currsize=currsize,
+            )
+
+    def get_many(
+        self,
+        namespace: str,
+        indexes: Sequence[int],
+        read: Callable[[Sequence[int]], Tensor],
+    ) -> Tensor:
+        tensors = {
+            index: tensor
+            for index in indexes
+            if (tensor := self._get(namespace, index)) is not None
+        }
+        missing = [index for index in indexes if index not in tensors]
+
+        with self._lock:
+            self._hits += len(tensors)
+            self._misses += len(missing)
+
+        if missing:
+            for index, tensor in zip(missing, read(missing), strict=True):
+                self._set(namespace, index, tensor)
+                tensors[index] = tensor
+
+        return torch.stack([tensors[index] for index in indexes])
+
+    def _entry_path(self, namespace: str, index: int) -> Path:
+        return self._path / namespace / f"{index}.npy"
+
+    def _get(self, namespace: str, index: int) -> Tensor | None:
+        path = self._entry_path(namespace, index)
+        try:
+            array = np.load(path)
+        except FileNotFoundError:
+            return None
+
+        # entries are evicted by their modification time, i.e. last use
+        with suppress(FileNotFoundError):
+            os.utime(path)
+
+        return torch.from_numpy(array)
+
+    def _set(self, namespace: str, index: int, tensor: Tensor) -> None:
+        if tensor.device.type != "cpu":
+            return
+
+        try:
+            array = tensor.numpy()
+        except TypeError:  # e.g. bfloat16
+            return
+
+        if array.nbytes > self._maxsize:
+            return
+
+        path = self._entry_path(namespace, index)
+        path.parent.mkdir(exist_ok=True)
+        with temporary_path(path) as path_tmp:
+            with path_tmp.open("wb") as f:
+                np.save(f, array)
+
+            self._commit(path_tmp, path)
+
+    def _commit(self, path_tmp: Path, path: Path) -> None:
+        nbytes = path_tmp.stat().st_size
+
+        # under the counter's lock, so that an entry written by concurrent misses
+        # is only counted once
+        with self._locked_counter("r+b") as f:
+            if path.exists():
+                return
+
+            (currsize,) = struct.unpack("<q", f.read(8))
+            if currsize + nbytes > self._maxsize:
+                currsize = self._evict(int(self._maxsize * _EVICT_TO) - nbytes)
+
+            if currsize + nbytes > self._maxsize:
+                return
+
+            # atomic, so that concurrent readers never observe partial entries
+            path_tmp.replace(path)
+            f.seek(0)
+            f.write(struct.pack("<q", currsize + nbytes))
+
+    def _evict(self, target: int) -> int:
+        # least recently used first, returning the size of the remaining entries
+        entries = sorted(self._entries())
+        currsize = sum(size for _, size, _ in entries)
+        evicted = 0
+        for _, size, path in entries:
+            if currsize <= target:
+                break
+
+            path.unlink(missing_ok=True)
+            currsize -= size
+            evicted += 1
+
+        logger.debug("evicted tensors", count=evicted, currsize=currsize)
+
+        return currsize
+
+    @contextmanager
+    def _locked_counter(self, mode: str) -> Generator[IO[Any]]:
+        # a fresh open file (description) per use, so that the lock also excludes
+        # other threads and forked processes
+        with (self._path / self.NBYTES).open(mode) as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.seek(0)
+            yield f
+
+    def _entries(self) -> Iterator[tuple[int, int, Path]]:
+        # (mtime, size, path) of entries, neither temporaries nor the counter
+        for root, _, names in self._path.walk():
+            for name in names:
+                if not name.endswith(".npy"):
+                    continue
+
+                try:
+                    stat = (path := root / name).stat()
+                except FileNotFoundError:  # evicted by another process
+                    continue
+
+                yield stat.st_mtime_ns, stat.st_size, path
+
+
+class SampleCache:
+    """A directory of sample tables, keyed by a fingerprint of how they were built."""
+
+    def __init__(self, config: SampleCacheConfig) -> None:
+        self._path: Path = config.path
+        self._path.mkdir(parents=True, exist_ok=True)
+
+    def get(self, key: str) -> pl.DataFrame | None:
+        try:
+            return pl.read_parquet(self._entry_path(key))
+        except FileNotFoundError:
+            return None
+
+    def set(self, key: str, samples: pl.DataFrame) -> None:
+        path = self._entry_path(key)
+        with temporary_path(path) as path_tmp:
+            samples.write_parquet(path_tmp)
+            path_tmp.replace(path)
+
+    def _entry_path(self, key: str) -> Path:
+        return self._path / f"{key}.parquet"
@@ -1,5 +1,6 @@
 from concurrent.futures import Executor
 from copy import deepcopy
+from enum import StrEnum, auto, unique
 from pathlib import Path
 from typing import Any, Literal, Self, override
 
@@ -9,9 +10,12 @@ from pipefunc._pipeline._types import OUTPUT_TYPE
 from pydantic import (
     BaseModel,
     ConfigDict,
+    DirectoryPath,
     Field,
     ImportString,
     InstanceOf,
+    NewPath,
+    PositiveInt,
     TypeAdapter,
     model_validator,
 )
@@ -71,6 +75,34 @@ class StreamConfig(BaseModel):
 type StreamsConfig = dict[str, StreamConfig]
 
 
+@unique
+class SourceCacheWeight(StrEnum):
+    count = auto()
+    nbytes = auto()
+    handles = auto()
+
+
+class SourceCacheConfig(BaseModel):
+    maxsize: PositiveInt | None = None
+    weight: SourceCacheWeight = SourceCacheWeight.count
+
+    model_config = ConfigDict(extra="forbid", frozen=True)
+
+
+class TensorCacheConfig(BaseModel):
+    path: DirectoryPath | NewPath
+    maxsize: PositiveInt
+
+    model_config = ConfigDict(extra="forbid", frozen=True)
+
+
+class SampleCacheConfig(BaseModel):
+    path: DirectoryPath | NewPath
+    content_hash: bool = False
+
+    model_config = ConfigDict(extra="forbid", frozen=True)
+
+
 class BasePipelineConfig(BaseModel):
     inputs: dict[str, list[Any]]
     run_folder: str | Path | None = None
@@ -1,16 +1,45 @@
-from collections.abc import Callable, Iterable, Sequence, Sized
-from typing import Any, Literal, Protocol, runtime_checkable
+import copy
+import math
+import multiprocessing.process as mpp
+import multiprocessing.queues as mpq
+import multiprocessing.synchronize as mps
+import os
+import pickle  # noqa: S403
+import queue
+import statistics
+import sys
+import threading
+import time
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator, Mapping, Sequence, Sized
+from contextlib import suppress
+from functools import cache, partial
+from importlib.metadata import version
+from io import BytesIO
+from typing import Any, Literal, NamedTuple, Protocol, override, runtime_checkable
 
+import numpy as np
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
 import torchdata.nodes as tn
-from pydantic import InstanceOf, PositiveInt, validate_call
-from torch import Generator
+from pydantic import ByteSize, InstanceOf, NonNegativeInt, PositiveInt, validate_call
+from structlog import get_logger
+from tensordict import TensorClass, TensorDictBase
+from torch import Generator, Size, Tensor
+from torch._utils import ExceptionWrapper  # noqa: PLC2701
 from torch.utils.data import (
     BatchSampler,
     RandomSampler,
+    Sampler,
     SequentialSampler,
     default_collate,
 )
-from torchdata.nodes.loader import LoaderIterator
+from xxhash import xxh3_64_intdigest
+
+from rbyte.metrics import MetricsSnapshot, WorkerMetrics
+
+logger = get_logger(__name__)
 
 
 def collate_identity[T](x: T) -> T:
@@ -23,6 +52,250 @@ class BatchIndexableDataset(Protocol):
     def __len__(self) -> int: ...
 
 
+@runtime_checkable
+class InputIdCodedDataset(Protocol):
+    @property
+    def input_id_codes(self) -> Tensor: ...
+
+
+@runtime_checkable
+class InstrumentedDataset(Protocol):
+    def collect_metrics(self, *, reset: bool = False) -> MetricsSnapshot | None: ...
+
+
+# a multiplicative hashing constant (2**64 / golden ratio)
+_FEISTEL_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+_FEISTEL_ROUNDS = 4
+
+
+def _permute(positions: np.ndarray, domain: int, key: str) -> np.ndarray:
+    # a keyed bijection on `range(domain)`, evaluated per position: a balanced
+    # Feistel network over the smallest even-bit power of two >= domain, with
+    # cycle walking for values that land outside of it
+    if domain <= 1:
+        return positions.copy()
+
+    half = (int(domain - 1).bit_length() + 1) // 2
+    shift, mask = np.uint64(half), np.uint64((1 << half) - 1)
+    keys = [np.uint64(xxh3_64_intdigest(f"{key}/{i}")) for i in range(_FEISTEL_ROUNDS)]
+
+    values = positions.astype(np.uint64)
+    pending = np.ones(len(values), dtype=bool)
+    while pending.any():
+        value = values[pending]
+        left, right = value >> shift, value & mask
+        for k in keys:
+            hashed = ((right ^ k) * _FEISTEL_MULTIPLIER) >> np.uint64(64 - half)
+            left, right = right, left ^ (hashed & mask)
+
+        values[pending] = (left << shift) | right
+        pending = values >= domain
+
+    return values.astype(np.int64)
+
+
+class _ResumableSampler(Sampler[int]):
+    """A rank's shard of a (shuffled) index space, resumable at any position.
+
+    Indexes are computed from `(seed, epoch, position)` alone, so that resuming
+    from `state_dict` neither replays nor materializes the skipped positions.
+    """
+
+    _CHUNK_SIZE = 1024
+
+    def __init__(
+        self, length: int, *, seed: int, rank: int, world_size: int, drop_last: bool
+    ) -> None:
+        super().__init__()
+
+        if rank >= world_size:
+            logger.error(msg := "`rank` must be less than `world_size`")
+
+            raise ValueError(msg)
+
+        self._length = length
+        self._seed = seed
+        self._rank = rank
+        self._world_size = world_size
+        # each rank yields the same number of indexes, padding by wrapping around
+        self._rank_length = (
+            length // world_size if drop_last else -(-length // world_size)
+        )
+        self._epoch = 0
+        self._position = 0
+
+    def _indexes(self, positions: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def set_epoch(self, epoch: int) -> None:
+        if epoch != self._epoch:
+            self._epoch, self._position = epoch, 0
+
+    def state_dict(self) -> dict[str, int]:
+        return {"seed": self._seed, "epoch": self._epoch, "position": self._position}
+
+    def load_state_dict(self, state_dict: dict[str, int]) -> None:
+        self._seed = state_dict["seed"]
+        self._epoch = state_dict["epoch"]
+        self._position = state_dict["position"]
+
+    @override
+    def __iter__(self) -> Iterator[int]:
+        while self._position < self._rank_length:
+            positions = np.arange(
+                self._position,
+                min(self._position + self._CHUNK_SIZE, self._rank_length),
+            )
+            for index in self._indexes(positions).tolist():
+                self._position += 1
+                yield index
+
+        self._epoch, self._position = self._epoch + 1, 0
+
+    def __len__(self) -> int:
+        return self._rank_length
+
+
+class ShardedSampler(_ResumableSampler):
+    """Strides rank `rank` of `world_size` over an (optionally) shuffled index space."""
+
+    @validate_call
+    def __init__(  # noqa: PLR0913
+        self,
+        data_source: InstanceOf[Sized],
+        *,
+        shuffle: bool = True,
+        seed: int = 0,
+        rank: NonNegativeInt = 0,
+        world_size: PositiveInt = 1,
+        drop_last: bool = False,
+    ) -> None:
+        super().__init__(
+            len(data_source),
+            seed=seed,
+            rank=rank,
+            world_size=world_size,
+            drop_last=drop_last,
+        )
+
+        self._shuffle = shuffle
+
+    @override
+    def _indexes(self, positions: np.ndarray) -> np.ndarray:
+        positions = (self._rank + self._world_size * positions) % self._length
+
+        return (
+            _permute(positions, self._length, f"{self._seed}/{self._epoch}")
+            if self._shuffle
+            else positions
+        )
+
+
+class BlockShuffleSampler(_ResumableSampler):
+    """Shuffles contiguous blocks of indexes, then indexes within a bounded buffer.
+
+    Blocks hold up to `block_size` consecutive indexes and never cross `groups`
+    (e.g. `input_id`) boundaries, so that most reads stay sequential per source.
+    Ranks are dealt disjoint, contiguous spans of the stream of shuffled blocks.
+    """
+
+    @validate_call
+    def __init__(  # noqa: PLR0913
+        self,
+        data_source: InstanceOf[Sized],
+        *,
+        block_size: PositiveInt,
+        buffer_size: PositiveInt,
+        groups: InstanceOf[Tensor] | None = None,
+        seed: int = 0,
+        rank: NonNegativeInt = 0,
+        world_size: PositiveInt = 1,
+        drop_last: bool = False,
+    ) -> None:
+        super().__init__(
+            len(data_source),
+            seed=seed,
+            rank=rank,
+            world_size=world_size,
+            drop_last=drop_last,
+        )
+
+        self._buffer_size = buffer_size
+        self._blocks = self._build_blocks(self._length, block_size, groups).numpy()
+        self._shuffled_blocks: tuple[tuple[int, int], np.ndarray, np.ndarray] | None = (
+            None
+        )
+
+    @staticmethod
+    def _build_blocks(length: int, block_size: int, groups: Tensor | None) -> Tensor:
+        run_starts = [0]
+        if groups is not None:
+            run_starts += ((groups[1:] != groups[:-1]).nonzero().flatten() + 1).tolist()
+
+        starts, stops = [], []
+        for run_start, run_stop in zip(
+            run_starts, [*run_starts[1:], length], strict=True
+        ):
+            run_block_starts = torch.arange(run_start, run_stop, block_size)
+            starts.append(run_block_starts)
+            stops.append((run_block_starts + block_size).clamp_max(run_stop))
+
+        return torch.stack((torch.cat(starts), torch.cat(stops)), dim=1)
+
+    def _get_blocks(self) -> tuple[np.ndarray, np.ndarray]:
+        # (start, stream offset) of this epoch's shuffled blocks, in order
+        match self._shuffled_blocks:
+            case (key, starts, offsets) if key == (self._seed, self._epoch):
+                return starts, offsets
+
+            case _:
+                order = _permute(
+                    np.arange(len(self._blocks)),
+                    len(self._blocks),
+                    f"{self._seed}/{self._epoch}/blocks",
+                )
+                starts, stops = self._blocks[order].T
+                offsets = np.cumsum(stops - starts) - (stops - starts)
+                self._shuffled_blocks = ((self._seed, self._epoch), starts, offsets)
+
+                return starts, offsets
+
+    @override
+    def _indexes(self, positions: np.ndarray) -> np.ndarray:
+        starts, offsets = self._get_blocks()
+
+        # shuffle within consecutive buffers of the rank's span of the stream
+        shuffled = np.empty_like(positions)
+        buffer_starts = positions - positions % self._buffer_size
+        for buffer_start in np.unique(buffer_starts).tolist():
+            mask = buffer_starts == buffer_start
+            shuffled[mask] = buffer_start + _permute(
+                positions[mask] - buffer_start,
+                min(self._buffer_size, self._rank_length - buffer_start),
+                f"{self._seed}/{self._epoch}/{buffer_start}",
+            )
+
+        stream_positions = (self._rank * self._rank_length + shuffled) % self._length
+        blocks = np.searchsorted(offsets, stream_positions, side="right") - 1
+
+        return starts[blocks] + stream_positions - offsets[blocks]
+
+
+class ResumableBatchSampler(BatchSampler):
+    # exposes the sampler's state to `tn.SamplerWrapper`, which otherwise resumes
+    # by replaying every batch yielded so far
+    sampler: _ResumableSampler
+
+    def set_epoch(self, epoch: int) -> None:
+        self.sampler.set_epoch(epoch)
+
+    def state_dict(self) -> dict[str, int]:
+        return self.sampler.state_dict()
+
+    def load_state_dict(self, state_dict: dict[str, int]) -> None:
+        self.sampler.load_state_dict(state_dict)
+
+
 class MapAndCollate[T]:
     @validate_call
     def __init__(
@@ -38,9 +311,741 @@ class MapAndCollate[T]:
         return self._collate_fn(batch)
 
 
+class InputIdRouter:
+    """Routes a batch to a worker by its most frequent `input_id`.
+
+    Rendezvous hashing keeps most assignments when the number of workers changes.
+    """
+
+    def __init__(self, input_id_codes: Tensor, num_workers: int) -> None:
+        self._input_id_codes = input_id_codes
+        self._num_workers = num_workers
+
+    def __call__(self, index: Sequence[int]) -> int:
+        code = int(self._input_id_codes[list(index)].mode().values)
+
+        return self._route(code, self._num_workers)
+
+    @staticmethod
+    @cache
+    def _route(code: int, num_workers: int) -> int:
+        return max(
+            range(num_workers), key=lambda worker: xxh3_64_intdigest(f"{code}:{worker}")
+        )
+
+
+_SHUTDOWN_TIMEOUT = 5.0
+
+type _Queue = queue.Queue[Any] | mpq.Queue[Any]
+
+
+def _routed_worker(
+    map_fn: Callable[[Any], Any],
+    in_queue: _Queue,
+    out_queue: _Queue,
+    stop: threading.Event | mps.Event,
+) -> None:
+    # items still queued once stopped are dropped
+    while not stop.is_set() and (item := in_queue.get()) is not None:
+        seq, x = item
+        try:
+            out_queue.put((seq, map_fn(x), None))
+        except Exception:  # noqa: BLE001
+            out_queue.put((
+                seq,
+                None,
+                ExceptionWrapper(where=f"in routed worker {seq}"),
+            ))
+
+
+def _map_batch[X](map_fn: Callable[[X], Any], xs: Sequence[X]) -> list[object]:
+    return [map_fn(x) for x in xs]
+
+
+class RoutedParallelMapper[X, T](tn.BaseNode[T]):
+    """A `ParallelMapper` sending each item to the worker chosen by `route`.
+
+    Every worker has its own input queue, so items routed alike always share a
+    worker (and hence its caches). With `prebatch`, items are sent in batches,
+    routed by their first item.
+    """
+
+    SOURCE_KEY = "source"
+    STEPS_SINCE_SNAPSHOT_KEY = "steps_since_snapshot"
+
+    def __init__(  # noqa: PLR0913
+        self,
+        source: tn.BaseNode[X],
+        map_fn: Callable[[X], T],
+        *,
+        route: Callable[[X], int],
+        num_workers: int,
+        in_order: bool = True,
+        method: Literal["thread", "process"] = "thread",
+        multiprocessing_context: Literal["spawn", "forkserver", "fork"] | None = None,
+        max_concurrent: int | None = None,
+        snapshot_frequency: PositiveInt = 1,
+        prebatch: PositiveInt | None = None,
+    ) -> None:
+        super().__init__()
+
+        self.source = (
+            source
+            if prebatch is None
+            else tn.Batcher(source, batch_size=prebatch, drop_last=False)
+        )
+        self._map_fn = map_fn if prebatch is None else partial(_map_batch, map_fn)
+        self._route = route
+        self._num_workers = num_workers
+        self._in_order = in_order
+        self._method = method
+        self._multiprocessing_context = multiprocessing_context
+        self._max_concurrent = max_concurrent or 2 * num_workers
+        self._snapshot_frequency = snapshot_frequency
+        self._prebatch = prebatch
+        self._in_queues: list[_Queue] = []
+        self._workers: list[threading.Thread | mpp.BaseProcess] = []
+
+    def reset(self, initial_state: dict[str, Any] | None = None) -> None:
+        super().reset(initial_state)
+        self.shutdown()
+
+        # resumes from the last snapshot, skipping the items yielded since
+        if initial_state is not None:
+            self.source.reset(initial_state[self.SOURCE_KEY])
+            fast_forward = initial_state[self.STEPS_SINCE_SNAPSHOT_KEY]
+        else:
+            self.source.reset()
+            fast_forward = 0
+
+        self._source_state = self.source.state_dict()
+        self._steps_since_snapshot = 0
+        # source states before submitting an item, every `snapshot_frequency` items
+        self._source_states: dict[int, dict[str, Any]] = {}
+        self._results: dict[int, tuple[object, ExceptionWrapper | None]] = {}
+        self._items: deque[T] = deque()
+        self._submitted = self._yielded = 0
+        self._exhausted = False
+        self._start()
+
+        for _ in range(fast_forward):
+            self.next()
+
+    def next(self) -> T:
+        if not self._items:
+            self._items.extend(self._next_mapped())
+
+        self._steps_since_snapshot += 1
+
+        return self._items.popleft()
+
+    def get_state(self) -> dict[str, Any]:
+        return {
+            self.SOURCE_KEY: self._source_state,
+            self.STEPS_SINCE_SNAPSHOT_KEY: self._steps_since_snapshot,
+        }
+
+    def _next_mapped(self) -> list[T]:
+        self._submit()
+
+        if self._yielded == self._submitted:
+            raise StopIteration
+
+        while (seq := self._ready()) is None:
+            self._receive()
+
+        result, error = self._results.pop(seq)
+        if (source_state := self._source_states.pop(seq, None)) is not None:
+            self._source_state = source_state
+            self._steps_since_snapshot = 0
+
+        self._yielded += 1
+
+        if error is not None:
+            error.reraise()
+
+        return result if self._prebatch is not None else [result]  # ty: ignore[invalid-return-type]
+
+    def _ready(self) -> int | None:
+        if self._in_order:
+            return self._yielded if self._yielded in self._results else None
+
+        return next(iter(self._results), None)
+
+    def _receive(self) -> None:
+        try:
+            seq, result, error = self._out_queue.get(timeout=1.0)
+        except queue.Empty:
+            self._check_workers()
+        else:
+            self._results[seq] = (result, error)
+
+    def _check_workers(self) -> None:
+        if not all(worker.is_alive() for worker in self._workers):
+            logger.error(msg := "routed worker exited unexpectedly")
+
+            raise RuntimeError(msg)
+
+    def _submit(self) -> None:
+        while (
+            not self._exhausted
+            and self._submitted - self._yielded < self._max_concurrent
+        ):
+            source_state = (
+                self.source.state_dict()
+                if not self._submitted % self._snapshot_frequency
+                else None
+            )
+            try:
+                x = next(self.source)
+            except StopIteration:
+                self._exhausted = True
+                break
+
+            worker = (
+                self._route(x if self._prebatch is None else x[0]) % self._num_workers
+            )
+            self._in_queues[worker].put((self._submitted, x))
+            if source_state is not None:
+                self._source_states[self._submitted] = source_state
+
+            self._submitted += 1
+
+    def _start(self) -> None:
+        match self._method:
+            case "thread":
+                self._in_queues = [queue.Queue() for _ in range(self._num_workers)]
+                self._out_queue = queue.Queue()
+                self._stop = threading.Event()
+                self._workers = [
+                    threading.Thread(
+                        target=_routed_worker,
+                        args=(self._map_fn, in_queue, self._out_queue, self._stop),
+                        daemon=True,
+                    )
+                    for in_queue in self._in_queues
+                ]
+
+            case "process":
+                ctx = mp.get_context(self._multiprocessing_context)
+                self._in_queues = [ctx.Queue() for _ in range(self._num_workers)]
+                self._out_queue = ctx.Queue()
+                self._stop = ctx.Event()
+                self._workers = [
+                    ctx.Process(
+                        target=_routed_worker,
+                        args=(self._map_fn, in_queue, self._out_queue, self._stop),
+                        daemon=True,
+                    )
+                    for in_queue in self._in_queues
+                ]
+
+        for worker in self._workers:
+            worker.start()
+
+    def shutdown(self) -> None:
+        # workers are stopped rather than terminated, which could leave the locks
+        # of their queues (or a shared memory ring) held
+        if not self._workers:
+            return
+
+        self._stop.set()
+        for in_queue in self._in_queues:
+            in_queue.put(None)
+
+        # results are dropped, draining them unblocks workers putting theirs
+        deadline = time.monotonic() + _SHUTDOWN_TIMEOUT
+        while (
+            alive := [worker for worker in self._workers if worker.is_alive()]
+        ) and time.monotonic() < deadline:
+            self._drain(self._out_queue)
+            alive[0].join(timeout=0.1)
+
+        if alive:
+            logger.warning("routed workers did not stop", workers=len(alive))
+
+        for q in (*self._in_queues, self._out_queue):
+            self._drain(q)
+            # process queues must not block exiting on items never consumed
+            if not isinstance(q, queue.Queue):
+                q.close()
+                q.cancel_join_thread()
+
+        self._workers = []
+        self._in_queues = []
+
+    @staticmethod
+    def _drain(q: _Queue) -> None:
+        with suppress(queue.Empty):
+            while True:
+                q.get_nowait()
+
+    def __del__(self) -> None:
+        # at exit, daemon workers are stopped by `multiprocessing` itself
+        if hasattr(self, "_workers") and not sys.is_finalizing():
+            self.shutdown()
+
+
+class _RingHandle(NamedTuple):
+    slot: int
+    payload: bytes
+    # of the slot, which the batch holds until released
+    nbytes: int
+
+
+class _SlotOverflowError(Exception):
+    pass
+
+
+class _RingPickler(pickle.Pickler):
+    _ALIGNMENT = 64
+
+    def __init__(self, file: BytesIO, buffer: Tensor) -> None:
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+
+        self._buffer = buffer
+        self._offset = 0
+
+    def persistent_id(self, obj: object) -> tuple[int, torch.dtype, Size] | None:
+        match obj:
+            case Tensor(device=torch.device(type="cpu")):
+                tensor = obj.detach().contiguous()
+                start = -(-self._offset // self._ALIGNMENT) * self._ALIGNMENT
+                stop = start + tensor.numel() * tensor.element_size()
+                if stop > len(self._buffer):
+                    raise _SlotOverflowError
+
+                self._buffer[start:stop] = tensor.reshape(-1).view(torch.uint8)
+                self._offset = stop
+
+                return start, tensor.dtype, tensor.shape
+
+            case _:
+                return None
+
+
+class _RingUnpickler(pickle.Unpickler):  # noqa: S301
+    def __init__(self, file: BytesIO, buffer: Tensor) -> None:
+        super().__init__(file)
+
+        self._buffer = buffer
+
+    def persistent_load(self, pid: tuple[int, torch.dtype, Size]) -> Tensor:
+        start, dtype, shape = pid
+        stop = start + shape.numel() * dtype.itemsize
+
+        return self._buffer[start:stop].view(dtype).view(shape)
+
+
+class SharedMemoryRing:
+    """Preallocated shared memory slots for moving batches out of worker processes.
+
+    A worker pickles a batch with its tensors written into a free slot, so that only
+    the slot's index and a small payload cross the process boundary, and the main
+    process unpickles the tensors as views into the slot. Batches fall back to
+    regular pickling when no slot is free or a batch does not fit into one.
+    """
+
+    @validate_call
+    def __init__(
+        self,
+        *,
+        num_slots: PositiveInt,
+        slot_size: ByteSize,
+        multiprocessing_context: Literal["spawn", "forkserver", "fork"] | None = None,
+        pin_memory: bool = False,
+    ) -> None:
+        self._lock = mp.get_context(multiprocessing_context).Lock()
+        self._slots = [
+            torch.empty(slot_size, dtype=torch.uint8).share_memory_()
+            for _ in range(num_slots)
+        ]
+        # the generation that took a slot, or 0 if the slot is free
+        self._owners = torch.zeros(num_slots, dtype=torch.int64).share_memory_()
+        self._generation = torch.ones((), dtype=torch.int64).share_memory_()
+        # slots are only registered with (and unregistered from) CUDA by this process
+        self._pinned_by = os.getpid() if pin_memory else None
+
+        if pin_memory:
+            cudart = torch.cuda.cudart()
+            for slot in self._slots:
+                torch.cuda.check_error(
+                    cudart.cudaHostRegister(slot.data_ptr(), slot.numel(), 0)
+                )
+
+    @property
+    def pinned(self) -> bool:
+        return self._pinned_by is not None
+
+    @property
+    def num_slots(self) -> int:
+        return len(self._slots)
+
+    def write(self, batch: object) -> object:
+        if (slot := self._acquire()) is None:
+            return batch
+
+        file = BytesIO()
+        try:
+            _RingPickler(file, self._slots[slot]).dump(batch)
+        except _SlotOverflowError:
+            self.release(slot)
+            logger.warning("batch exceeds shared memory slot size", slot=slot)
+
+            return batch
+
+        return _RingHandle(slot, file.getvalue(), self._slots[slot].nbytes)
+
+    def read(self, handle: _RingHandle) -> object:
+        return _RingUnpickler(BytesIO(handle.payload), self._slots[handle.slot]).load()
+
+    def release(self, slot: int) -> None:
+        with self._lock:
+            self._owners[slot] = 0
+
+    def advance_generation(self) -> None:
+        with self._lock:
+            self._generation += 1
+
+    def reclaim(self) -> None:
+        # frees slots taken by workers of previous generations
+        with self._lock:
+            self._owners[self._owners < self._generation] = 0
+
+    def _acquire(self) -> int | None:
+        with self._lock:
+            free = (self._owners == 0).nonzero().flatten().tolist()
+            if not free:
+                return None
+
+            self._owners[free[0]] = self._generation
+
+            return free[0]
+
+    def close(self) -> None:
+        if self._pinned_by != os.getpid():
+            return
+
+        cudart = torch.cuda.cudart()
+        for slot in self._slots:
+            torch.cuda.check_error(cudart.cudaHostUnregister(slot.data_ptr()))
+
+        self._pinned_by = None
+
+    def __del__(self) -> None:
+        if hasattr(self, "_pinned_by"):
+            self.close()
+
+
+def _map_to_ring[X](map_fn: Callable[[X], Any], ring: SharedMemoryRing, x: X) -> object:
+    return ring.write(map_fn(x))
+
+
+class SharedMemoryRingReader[T](tn.BaseNode[T]):
+    """Unpickles batches from `ring` slots, releasing one when the consumer advances.
+
+    Pinned slots are only released once the work queued on the current CUDA stream
+    by then (e.g. a `non_blocking` copy out of the slot) has completed, so copies
+    must be made on that stream.
+    """
+
+    SOURCE_KEY = "source"
+
+    def __init__(self, source: tn.BaseNode[Any], ring: SharedMemoryRing) -> None:
+        super().__init__()
+
+        self.source = source
+        self._ring = ring
+        self._slot: int | None = None
+        self._pending: deque[tuple[int, torch.cuda.Event]] = deque()
+
+    def reset(self, initial_state: dict[str, Any] | None = None) -> None:
+        super().reset(initial_state)
+        self.shutdown()
+
+        # slots held by the previous workers are reclaimed once they are replaced
+        self._ring.advance_generation()
+        if initial_state is not None:
+            self.source.reset(initial_state[self.SOURCE_KEY])
+        else:
+            self.source.reset()
+
+        self._ring.reclaim()
+
+    def next(self) -> T:
+        self._release()
+
+        match item := next(self.source):
+            case _RingHandle(slot=slot):
+                self._slot = slot
+
+                return self._ring.read(item)  # ty: ignore[invalid-return-type]
+
+            case _:
+                return item
+
+    def get_state(self) -> dict[str, Any]:
+        return {self.SOURCE_KEY: self.source.state_dict()}
+
+    def _release(self) -> None:
+        if self._slot is not None:
+            if self._ring.pinned:
+                event = torch.cuda.Event()
+                event.record()
+                self._pending.append((self._slot, event))
+            else:
+                self._ring.release(self._slot)
+
+            self._slot = None
+
+        while self._pending and self._pending[0][1].query():
+            self._ring.release(self._pending.popleft()[0])
+
+    def shutdown(self) -> None:
+        self._release()
+        while self._pending:
+            slot, event = self._pending.popleft()
+            event.synchronize()
+            self._ring.release(slot)
+
+
+def _map_with_metrics[X](
+    map_fn: Callable[[X], Any], dataset: InstrumentedDataset, x: X
+) -> tuple[MetricsSnapshot | None, object]:
+    batch = map_fn(x)
+
+    # only what was recorded since the previous batch (of this worker)
+    return dataset.collect_metrics(reset=True), batch
+
+
+class WorkerMetricsCollector[T](tn.BaseNode[T]):
+    """Strips the metrics that workers attach to batches, accumulating them."""
+
+    SOURCE_KEY = "source"
+
+    def __init__(self, source: tn.BaseNode[Any], metrics: WorkerMetrics) -> None:
+        super().__init__()
+
+        self.source = source
+        self._metrics = metrics
+
+    def reset(self, initial_state: dict[str, Any] | None = None) -> None:
+        super().reset(initial_state)
+
+        if initial_state is not None:
+            self.source.reset(initial_state[self.SOURCE_KEY])
+        else:
+            self.source.reset()
+
+    def next(self) -> T:
+        snapshot, item = next(self.source)
+        if snapshot is not None:
+            self._metrics.add(snapshot)
+
+        return item
+
+    def get_state(self) -> dict[str, Any]:
+        return {self.SOURCE_KEY: self.source.state_dict()}
+
+
+# torchdata nodes only stop their threads and processes on garbage collection, which
+# those very threads may put off indefinitely, and have no public API for it but in
+# the private iterators of the versions below
+_TORCHDATA_VERSION = tuple(map(int, version("torchdata").split(".")[:2]))
+_TORCHDATA_SHUTDOWN_VERSIONS = frozenset({(0, 11)})
+
+
+@runtime_checkable
+class _Shutdownable(Protocol):
+    def shutdown(self) -> None: ...
+
+
+def _shutdown_torchdata(node: tn.BaseNode[Any]) -> None:
+    if _TORCHDATA_VERSION not in _TORCHDATA_SHUTDOWN_VERSIONS:
+        logger.debug("torchdata node left to garbage collection", node=type(node))
+        return
+
+    # ParallelMapper > (Unbatcher >) _ParallelMapperImpl > _ParallelMapperIter,
+    # Prefetcher | PinMemory > _SingleThreadedMapper
+    it = getattr(node, "_it", None)
+    if isinstance(it, tn.Unbatcher):
+        it = it.source
+
+    if isinstance(it, tn.BaseNode):
+        it = getattr(it, "_it", None)
+
+    if (shutdown := getattr(it, "_shutdown", None)) is not None:
+        shutdown()
+
+
+def _shutdown_nodes(node: tn.BaseNode[Any] | None) -> None:
+    # consumers go first, so that nothing pulls from the nodes being stopped
+    while node is not None:
+        if isinstance(node, _Shutdownable):
+            node.shutdown()
+        else:
+            _shutdown_torchdata(node)
+
+        node = getattr(node, "source", None)
+
+
+class Concurrency(NamedTuple):
+    num_workers: int
+    prefetch_factor: int
+    max_concurrent: int | None
+
+
+class _AutotuneStats(NamedTuple):
+    producer_latencies: list[float]
+    consumer_waits: list[float]
+    consumer_steps: list[float]
+    batch_nbytes: list[int]
+
+
+def _timed_map[X](map_fn: Callable[[X], Any], x: X) -> tuple[float, object]:
+    start = time.perf_counter()
+    batch = map_fn(x)
+
+    return time.perf_counter() - start, batch
+
+
+def _nbytes(batch: object) -> int:
+    match batch:
+        case _RingHandle(nbytes=nbytes):
+            return nbytes
+
+        case Tensor():
+            return batch.nbytes
+
+        case TensorDictBase() | TensorClass():
+            return batch.bytes()
+
+        case Mapping():
+            return sum(map(_nbytes, batch.values()))
+
+        case list() | tuple():
+            return sum(map(_nbytes, batch))
+
+        case _:
+            return 0
+
+
+class BytePrefetcher[T](tn.BaseNode[T]):
+    """A `Prefetcher` bounded by the bytes, rather than the count, of batches.
+
+    A background thread pulls from `source` while prefetched batches take up less
+    than `max_bytes` (always allowing one), otherwise leaving it to back up.
+    """
+
+    SOURCE_KEY = "source"
+
+    def __init__(self, source: tn.BaseNode[T], max_bytes: int) -> None:
+        super().__init__()
+
+        self.source = source
+        self._max_bytes = max_bytes
+        self._thread: threading.Thread | None = None
+
+    def reset(self, initial_state: dict[str, Any] | None = None) -> None:
+        super().reset(initial_state)
+        self.shutdown()
+
+        if initial_state is not None:
+            self.source.reset(initial_state[self.SOURCE_KEY])
+        else:
+            self.source.reset()
+
+        self._source_state = self.source.state_dict()
+        # (item or terminal exception, nbytes, source state)
+        self._buffer: deque[tuple[Any, int, dict[str, Any]]] = deque()
+        self._nbytes = 0
+        self._condition = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._prefetch, daemon=True)
+        self._thread.start()
+
+    def next(self) -> T:
+        with self._condition:
+            self._condition.wait_for(lambda: self._buffer)
+            item, nbytes, source_state = self._buffer.popleft()
+            self._nbytes -= nbytes
+            self._condition.notify_all()
+
+        match item:
+            case StopIteration():
+                raise StopIteration
+
+            case ExceptionWrapper():
+                item.reraise()
+
+            case _:
+                pass
+
+        self._source_state = source_state
+
+        return item
+
+    def get_state(self) -> dict[str, Any]:
+        return {self.SOURCE_KEY: self._source_state}
+
+    @property
+    def nbytes(self) -> int:
+        return self._nbytes
+
+    def _prefetch(self) -> None:
+        while True:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: (
+                        self._stop.is_set()
+                        or not self._buffer
+                        or self._nbytes < self._max_bytes
+                    )
+                )
+
+            if self._stop.is_set():
+                return
+
+            try:
+                item = next(self.source)
+            except StopIteration as e:
+                item = e
+            except Exception:  # noqa: BLE001
+                item = ExceptionWrapper(where="in byte prefetcher")
+
+            nbytes = _nbytes(item)
+            with self._condition:
+                self._buffer.append((item, nbytes, self.source.state_dict()))
+                self._nbytes += nbytes
+                self._condition.notify_all()
+
+            if isinstance(item, StopIteration | ExceptionWrapper):
+                return
+
+    def shutdown(self) -> None:
+        if self._thread is not None:
+            self._stop.set()
+            with self._condition:
+                self._condition.notify_all()
+
+            self._thread.join()
+            self._thread = None
+
+    def __del__(self) -> None:
+        if hasattr(self, "_thread"):
+            self.shutdown()
+
+
 class TorchDataNodeDataLoader[T](Iterable[T], Sized):
     """https://meta-pytorch.org/data/main/migrate_to_nodes_from_utils.html"""
 
+    AUTOTUNE_ROUNDS = 3
+    # consumer wait, relative to its step time, that calls for more workers
+    AUTOTUNE_WAIT_TOLERANCE = 0.05
+    # fraction of available memory that batches in flight may take up
+    AUTOTUNE_MEMORY_FRACTION = 0.5
+    AUTOTUNE_MAX_PREFETCH_FACTOR = 8
+
     @validate_call
     def __init__(  # noqa: PLR0913
         self,
@@ -61,45 +1066,367 @@ class TorchDataNodeDataLoader[T](Iterable[T], Sized):
         max_concurrent: int | None = None,
         snapshot_frequency: int = 1,
         prebatch: int | None = None,
+        block_size: PositiveInt | None = None,
+        shuffle_buffer_size: PositiveInt | None = None,
+        route_by_input_id: bool = False,
+        distributed: bool = False,
+        resumable: bool = False,
+        seed: int | None = None,
+        shared_memory_slot_size: ByteSize | None = None,
+        shared_memory_slots: PositiveInt | None = None,
+        autotune: bool = False,
+        autotune_batches: PositiveInt = 32,
+        prefetch_bytes: ByteSize | None = None,
+        collect_metrics: bool = False,
     ) -> None:
         self._dataset = dataset
+        self._sampler = self._build_sampler(
+            dataset,
+            batch_size=batch_size,
+            shuffle=bool(shuffle),
+            drop_last=drop_last,
+            generator=generator,
+            block_size=block_size,
+            shuffle_buffer_size=shuffle_buffer_size,
+            distributed=distributed,
+            resumable=resumable,
+            seed=seed,
+        )
+
+        match method, shared_memory_slot_size, route_by_input_id, dataset:
+            case "thread", int(), _, _:
+                logger.error(
+                    msg := "`shared_memory_slot_size` requires `method='process'`"
+                )
+
+                raise ValueError(msg)
+
+            case _, _, True, dataset if not isinstance(dataset, InputIdCodedDataset):
+                logger.error(msg := "`route_by_input_id` requires `input_id_codes`")
+
+                raise ValueError(msg)
+
+            case _ if collect_metrics and not isinstance(dataset, InstrumentedDataset):
+                logger.error(
+                    msg := "`collect_metrics` requires a dataset with `collect_metrics`"
+                )
 
-        sampler = (
-            RandomSampler(dataset, generator=generator)
-            if shuffle
-            else SequentialSampler(dataset)
+                raise ValueError(msg)
+
+            case _:
+                pass
+
+        self._map_fn = MapAndCollate(dataset, collate_fn or default_collate)
+        self._pin_memory = pin_memory
+        self._pin_memory_device = pin_memory_device
+        self._in_order = in_order
+        self._method = method
+        self._multiprocessing_context = multiprocessing_context
+        self._snapshot_frequency = snapshot_frequency
+        self._prebatch = prebatch
+        self._route_by_input_id = route_by_input_id
+        self._shared_memory_slot_size = shared_memory_slot_size
+        self._shared_memory_slots = shared_memory_slots
+        self._prefetch_bytes = prefetch_bytes
+        self._autotune_batches = autotune_batches if autotune else None
+        self._worker_metrics = WorkerMetrics() if collect_metrics else None
+
+        self._concurrency = Concurrency(num_workers, prefetch_factor, max_concurrent)
+        self._ring: SharedMemoryRing | None = None
+        # until tuned, batches come with their producer latency
+        self._loader = self._build_loader(self._concurrency, timed=autotune)
+
+    @staticmethod
+    def _build_sampler(  # noqa: PLR0913
+        dataset: BatchIndexableDataset,
+        *,
+        batch_size: int,
+        shuffle: bool,
+        drop_last: bool,
+        generator: Generator | None,
+        block_size: int | None,
+        shuffle_buffer_size: int | None,
+        distributed: bool,
+        resumable: bool,
+        seed: int | None,
+    ) -> BatchSampler:
+        rank, world_size = (
+            (dist.get_rank(), dist.get_world_size()) if distributed else (0, 1)
         )
 
-        self._sampler = BatchSampler(
+        # `torch.utils.data.DataLoader`'s samplers (resumed by replaying them),
+        # unless sharded, resumable or block shuffled ones are asked for
+        if not (distributed or resumable or (shuffle and block_size is not None)):
+            if seed is not None and generator is None:
+                generator = torch.Generator().manual_seed(seed)
+
+            return BatchSampler(
+                RandomSampler(dataset, generator=generator)
+                if shuffle
+                else SequentialSampler(dataset),
+                batch_size=batch_size,
+                drop_last=drop_last,
+            )
+
+        if seed is None:
+            # ranks must agree on the permutation
+            seed = (
+                0
+                if distributed
+                else int(
+                    torch.empty((), dtype=torch.int64).random_(generator=generator)
+                )
+            )
+
+        match block_size:
+            case int() if shuffle:
+                sampler = BlockShuffleSampler(
+                    dataset,
+                    block_size=block_size,
+                    # by default, a batch mixes indexes from several blocks
+                    buffer_size=shuffle_buffer_size or 4 * max(block_size, batch_size),
+                    groups=dataset.input_id_codes
+                    if isinstance(dataset, InputIdCodedDataset)
+                    else None,
+                    seed=seed,
+                    rank=rank,
+                    world_size=world_size,
+                    drop_last=drop_last,
+                )
+
+            case _:
+                sampler = ShardedSampler(
+                    dataset,
+                    shuffle=shuffle,
+                    seed=seed,
+                    rank=rank,
+                    world_size=world_size,
+                    drop_last=drop_last,
+                )
+
+        return ResumableBatchSampler(
             sampler, batch_size=batch_size, drop_last=drop_last
         )
 
-        node = tn.SamplerWrapper(self._sampler)
-        node = tn.ParallelMapper(
-            source=node,
-            map_fn=MapAndCollate(dataset, collate_fn or default_collate),
-            num_workers=num_workers,
-            in_order=in_order,
-            method=method,
-            multiprocessing_context=multiprocessing_context,
-            max_concurrent=max_concurrent,
-            snapshot_frequency=snapshot_frequency,
-            prebatch=prebatch,
-        )
+    def _build_loader(
+        self, concurrency: Concurrency, *, timed: bool = False
+    ) -> tn.Loader:
+        num_workers, prefetch_factor, max_concurrent = concurrency
+        # loaders being replaced may still be drawing from their sampler
+        node = tn.SamplerWrapper(copy.deepcopy(self._sampler))
+        map_fn = self._map_fn
 
-        if pin_memory:
-            node = tn.PinMemory(node, pin_memory_device=pin_memory_device)
+        if timed:
+            map_fn = partial(_timed_map, map_fn)
+
+        match self._shared_memory_slot_size:
+            case None:
+                ring = None
+
+            case slot_size:
+                ring = self._get_ring(
+                    # enough for every batch in flight, beyond which batches fall
+                    # back to regular pickling
+                    num_slots=self._shared_memory_slots
+                    or (max_concurrent or 2 * num_workers)
+                    + num_workers * prefetch_factor
+                    + 2,
+                    slot_size=slot_size,
+                )
+                map_fn = partial(_map_to_ring, map_fn, ring)
+
+        match self._worker_metrics, self._dataset:
+            case WorkerMetrics(), InstrumentedDataset():
+                map_fn = partial(_map_with_metrics, map_fn, self._dataset)
+
+            case _:
+                pass
+
+        match self._route_by_input_id, self._dataset:
+            case True, InputIdCodedDataset():
+                node = RoutedParallelMapper(
+                    source=node,
+                    map_fn=map_fn,
+                    route=InputIdRouter(self._dataset.input_id_codes, num_workers),
+                    num_workers=num_workers,
+                    in_order=self._in_order,
+                    method=self._method,
+                    multiprocessing_context=self._multiprocessing_context,
+                    max_concurrent=max_concurrent,
+                    snapshot_frequency=self._snapshot_frequency,
+                    prebatch=self._prebatch,
+                )
+
+            case _:
+                node = tn.ParallelMapper(
+                    source=node,
+                    map_fn=map_fn,
+                    num_workers=num_workers,
+                    in_order=self._in_order,
+                    method=self._method,
+                    multiprocessing_context=self._multiprocessing_context,
+                    # at most one item per worker, of which tuning may leave fewer
+                    max_concurrent=max_concurrent
+                    if max_concurrent is None
+                    else min(max_concurrent, num_workers),
+                    snapshot_frequency=self._snapshot_frequency,
+                    prebatch=self._prebatch,
+                )
+
+        if self._worker_metrics is not None:
+            node = WorkerMetricsCollector(node, self._worker_metrics)
+
+        # ring slots are pinned in place, batches that did not fit are not, while
+        # ring handles pass through as they are
+        if self._pin_memory:
+            node = tn.PinMemory(node, pin_memory_device=self._pin_memory_device)
+
+        match self._prefetch_bytes:
+            case None:
+                node = tn.Prefetcher(
+                    node, prefetch_factor=num_workers * prefetch_factor
+                )
+
+            case max_bytes:
+                node = BytePrefetcher(node, max_bytes=max_bytes)
+
+        if ring is not None:
+            node = SharedMemoryRingReader(node, ring)
+
+        return tn.Loader(node)
+
+    def _get_ring(self, *, num_slots: int, slot_size: int) -> SharedMemoryRing:
+        # reused by rebuilt loaders, unless it has too few slots for them
+        if self._ring is None or self._ring.num_slots < num_slots:
+            if self._ring is not None:
+                self._ring.close()
+
+            self._ring = SharedMemoryRing(
+                num_slots=num_slots,
+                slot_size=ByteSize(slot_size),
+                multiprocessing_context=self._multiprocessing_context,
+                pin_memory=self._pin_memory,
+            )
+
+        return self._ring
+
+    def __iter__(self) -> Iterator[T]:
+        if self._autotune_batches is None:
+            return iter(self._loader)
+
+        return self._autotune(self._autotune_batches)
+
+    def _autotune(self, num_batches: int) -> Iterator[T]:
+        # tunes during the first epoch, resuming each rebuilt loader where the
+        # previous one stopped
+        it = iter(self._loader)
+        for _ in range(self.AUTOTUNE_ROUNDS):
+            stats = _AutotuneStats([], [], [], [])
+            while len(stats.consumer_waits) < num_batches:
+                start = time.perf_counter()
+                try:
+                    latency, batch = next(it)
+                except StopIteration:
+                    return
 
-        node = tn.Prefetcher(node, prefetch_factor=num_workers * prefetch_factor)
+                stop = time.perf_counter()
+                yield batch
+                stats.producer_latencies.append(latency)
+                stats.consumer_waits.append(stop - start)
+                stats.consumer_steps.append(time.perf_counter() - stop)
+                stats.batch_nbytes.append(_nbytes(batch))
 
-        self._loader = tn.Loader(node)
+            concurrency = self._tune(self._concurrency, stats)
+            if concurrency[:2] == self._concurrency[:2]:
+                break
+
+            self._concurrency = concurrency
+            it = self._rebuild_loader(timed=True)
+
+        logger.info("autotuned dataloader", **self._concurrency._asdict())
+
+        self._autotune_batches = None
+        yield from self._rebuild_loader(timed=False)
+
+    def _rebuild_loader(self, *, timed: bool) -> Iterator[Any]:
+        state = self._loader.state_dict()
+        # before the ring's slots get reclaimed from its workers
+        _shutdown_nodes(self._loader.root)
+        self._loader = self._build_loader(self._concurrency, timed=timed)
+        self._loader.load_state_dict(state)
 
-    def __iter__(self) -> LoaderIterator[T]:
         return iter(self._loader)
 
+    @classmethod
+    def _tune(cls, concurrency: Concurrency, stats: _AutotuneStats) -> Concurrency:
+        producer_latency = statistics.fmean(stats.producer_latencies)
+        consumer_wait = statistics.fmean(stats.consumer_waits)
+        consumer_step = max(statistics.fmean(stats.consumer_steps), 1e-6)
+        batch_nbytes = max(stats.batch_nbytes)
+
+        # enough workers to produce a batch per consumer step, more if the consumer
+        # still waits...
+        num_workers = max(math.ceil(producer_latency / consumer_step), 1)
+        if consumer_wait > cls.AUTOTUNE_WAIT_TOLERANCE * consumer_step:
+            num_workers = max(num_workers, concurrency.num_workers + 1)
+
+        num_workers = min(num_workers, max(len(os.sched_getaffinity(0)) - 1, 1))
+        # ...and a prefetch deep enough to absorb the slowest batch
+        prefetch_factor = min(
+            max(math.ceil(max(stats.producer_latencies) / producer_latency), 1)
+            if producer_latency > 0
+            else 1,
+            cls.AUTOTUNE_MAX_PREFETCH_FACTOR,
+        )
+
+        # batches in flight: prefetched, plus up to `max_concurrent` being mapped
+        budget = cls.AUTOTUNE_MEMORY_FRACTION * (
+            os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+        )
+        while (
+            num_workers * (prefetch_factor + 2) * batch_nbytes > budget
+            and num_workers * prefetch_factor > 1
+        ):
+            if prefetch_factor > 1:
+                prefetch_factor -= 1
+            else:
+                num_workers -= 1
+
+        logger.debug(
+            "autotune round",
+            producer_latency=producer_latency,
+            consumer_wait=consumer_wait,
+            consumer_step=consumer_step,
+            batch_nbytes=batch_nbytes,
+            num_workers=num_workers,
+            prefetch_factor=prefetch_factor,
+        )
+
+        # `max_concurrent` is the user's to set, never tuned
+        return Concurrency(num_workers, prefetch_factor, concurrency.max_concurrent)
+
     def __len__(self) -> int:
         return len(self._sampler)
 
     @property
     def dataset(self) -> BatchIndexableDataset:
         return self._dataset
+
+    @property
+    def concurrency(self) -> Concurrency:
+        return self._concurrency
+
+    def worker_metrics(
+        self, *, reset: bool = False
+    ) -> dict[int, MetricsSnapshot] | None:
+        # by worker pid, with `collect_metrics`
+        if self._worker_metrics is None:
+            return None
+
+        return self._worker_metrics.snapshot(reset=reset)
+
+    def state_dict(self) -> dict[str, Any]:
+        return self._loader.state_dict()
+
+    def load_state_dict(self, state_dict: dict[str, Any]) -> None:
+        self._loader.load_state_dict(state_dict)
@@ -1,42 +1,84 @@
+import asyncio
+import inspect
 import math
-from collections.abc import Sequence
-from concurrent.futures import Executor
+import os
+import sys
+from collections.abc import Callable, Hashable, Iterator, Mapping, Sequence
+from concurrent.futures import Executor, ThreadPoolExecutor
+from contextlib import AbstractContextManager, nullcontext, suppress
 from enum import StrEnum, auto, unique
+from functools import partial
+from importlib.metadata import version
 from io import BytesIO
-from typing import TYPE_CHECKING, Annotated, Any, Self, override
+from itertools import islice
+from os import PathLike
+from pathlib import Path
+from threading import Lock
+from types import TracebackType
+from typing import TYPE_CHECKING, Annotated, Any, BinaryIO, Self, cast, override
 
 import checkedframe as cf
+import numpy as np
 import polars as pl
 import torch
-from cachetools import Cache, cachedmethod
+from cachetools import cachedmethod
+from hydra.utils import get_object
 from optree import tree_map
+from optree.typing import PyTree
 from pipefunc.map import load_outputs
 from pydantic import (
     AfterValidator,
+    BaseModel,
     DirectoryPath,
     InstanceOf,
+    NewPath,
+    NonNegativeInt,
+    PositiveInt,
     TypeAdapter,
     validate_call,
 )
+from pydantic_core import to_json
 from structlog import get_logger
-from tensordict import NonTensorStack, TensorDict
+from tensordict import MemoryMappedTensor, NonTensorStack, TensorDict
+from torch import Tensor
 from torch.utils.data import Dataset as TorchDataset
+from xxhash import xxh3_64
+from xxhash import xxh3_64_hexdigest as digest
 
+from rbyte.cache import (
+    CachedSource,
+    SampleCache,
+    SourceCache,
+    SourceCacheInfo,
+    TensorCache,
+    TensorCacheInfo,
+)
 from rbyte.config import (
     HydraConfig,
     PipelineHydraConfig,
     PipelineInstanceConfig,
+    SampleCacheConfig,
+    SourceCacheConfig,
+    StreamConfig,
     StreamsConfig,
+    TensorCacheConfig,
 )
-from rbyte.types import Batch, BatchMeta, TensorSource
+from rbyte.io.memmap import MemmapTensorSource
+from rbyte.metrics import DatasetMetrics, MetricsKey, MetricsSnapshot, Stage
+from rbyte.types import Batch, BatchMeta, EncodedBatchMeta, TensorSource
+from rbyte.utils import temporary_path
 
 if TYPE_CHECKING:
+    from pipefunc import PipeFunc
     from pipefunc._pipeline._types import OUTPUT_TYPE
 
-__all__ = ["Dataset"]
+__all__ = ["Dataset", "DatasetWriter"]
 
 logger = get_logger(__name__)
 
+# of getting a cached source, before giving up on it being evicted in the meantime
+_SOURCE_ATTEMPTS = 8
+
 
 @unique
 class MetaColumn(StrEnum):
@@ -51,18 +93,300 @@ if not set(MetaColumn).issubset(MetaSchema.columns()):
     raise ValueError
 
 
-class Dataset(TorchDataset[Batch]):  # noqa: PLW1641
-    __slots__ = ("_data", "_meta", "_stream_source_cache", "_streams")
+class _ShardedColumn(BaseModel):
+    key: tuple[str, ...]
+    dtype: str
+    shape: tuple[NonNegativeInt, ...]
+
+    @property
+    def row_nbytes(self) -> int:
+        return getattr(torch, self.dtype).itemsize * math.prod(self.shape)
+
+
+class _ShardedIndex(BaseModel):
+    length: NonNegativeInt
+    row_group_size: PositiveInt
+    row_groups: NonNegativeInt
+    columns: list[_ShardedColumn]
+    meta_columns: list[str]
+    # categories of the `input_id` codes, and whether meta had them as an `Enum`
+    input_ids: list[str]
+    input_id_enum: bool
+
+
+def _split_samples(samples: pl.DataFrame) -> tuple[TensorDict, pl.DataFrame]:
+    samples = MetaSchema.validate(samples)
+
+    data = TensorDict(
+        samples.select(pl.exclude(MetaSchema.columns()).to_physical()).to_torch(
+            return_type="dict"
+        ),
+        batch_size=[len(samples)],
+    )
+
+    meta = samples.select(MetaSchema.columns()).rechunk()
+
+    return data, meta
+
+
+def _getitem[T](
+    data: TensorDict,
+    index: str | tuple[str, ...] | Tensor | slice | list[int],
+    cls: type[T],
+) -> T:
+    # `TensorDict.__getitem__` is typed for keys and indexes alike
+    match data[index]:
+        case cls() as item:
+            return item
+
+        case _:
+            raise TypeError
+
+
+def _fingerprint_samples(
+    samples: PipelineInstanceConfig | PipelineHydraConfig, *, content_hash: bool
+) -> str:
+    match samples:
+        case PipelineInstanceConfig():
+            pipeline = [
+                _fingerprint_function(func) for func in samples.pipeline.functions
+            ]
+
+        case PipelineHydraConfig():
+            pipeline = samples.pipeline.model_dump(mode="json", by_alias=True)
+            # targets are configured by name, their code is what changes the output
+            pipeline = [
+                pipeline,
+                {
+                    target: _fingerprint_target(get_object(target))
+                    for target in sorted(_find_targets(pipeline))
+                },
+            ]
+
+    inputs = tree_map(
+        partial(_fingerprint_input, content_hash=content_hash),
+        cast(PyTree[Any], samples.inputs),
+    )
+    # executors and the run folder do not change the output
+    kwargs = samples.model_dump(
+        exclude={"pipeline", "executor", "inputs", "run_folder", "return_results"}
+    )
+
+    return digest(to_json([version("rbyte"), pipeline, inputs, kwargs], fallback=repr))
+
+
+def _find_targets(config: object) -> Iterator[str]:
+    match config:
+        case dict():
+            if isinstance(target := config.get("_target_"), str):
+                yield target
+
+            for value in config.values():
+                yield from _find_targets(value)
+
+        case list():
+            for value in config:
+                yield from _find_targets(value)
+
+        case _:
+            pass
+
+
+def _fingerprint_target(target: Callable[..., object]) -> str:
+    match getattr(target, "__pipefunc_hash__", None):
+        case Callable() as pipefunc_hash if not isinstance(target, type):
+            return pipefunc_hash()
+
+        case _:
+            pass
+
+    try:
+        return digest(inspect.getsource(target))
+    except (OSError, TypeError):
+        # e.g. builtins and extension modules, which change with their package
+        module = getattr(target, "__module__", None) or ""
+        package = sys.modules.get(module.partition(".")[0])
+        return to_json([
+            module,
+            getattr(target, "__qualname__", None),
+            getattr(package, "__version__", None),
+        ]).decode()
+
+
+def _fingerprint_function(func: "PipeFunc[..., Any]") -> list[Any]:
+    match getattr(func.func, "__pipefunc_hash__", None):
+        case None:
+            # unhashable callables get a `repr` (which usually includes their id)
+            # and hence are never reused
+            function = func.func
+            function_hash = (
+                _fingerprint_target(function)
+                if hasattr(function, "__code__")
+                else repr(function)
+            )
+
+        case pipefunc_hash:
+            function_hash = pipefunc_hash()
+
+    return [
+        func.output_name,
+        function_hash,
+        func.renames,
+        func.bound,
+        str(func.mapspec),
+    ]
+
+
+def _fingerprint_input(value: object, *, content_hash: bool) -> object:
+    match value:
+        case str() | PathLike() if (path := Path(value)).exists():
+            paths = [path] if path.is_file() else sorted(path.rglob("*"))
+            return [
+                _fingerprint_file(path, content_hash=content_hash)
+                for path in paths
+                if path.is_file()
+            ]
+
+        case _:
+            return value
+
+
+def _fingerprint_source_value(value: object) -> object:
+    # only absolute paths, as relative ones would resolve against the working dir
+    match value:
+        case str() | PathLike() if Path(value).is_absolute():
+            return _fingerprint_input(value, content_hash=False)
+
+        case _:
+            return value
+
+
+def _fingerprint_file(path: Path, *, content_hash: bool) -> tuple[str, int, int | str]:
+    stat = path.stat()
+    if not content_hash:
+        return path.resolve().as_posix(), stat.st_size, stat.st_mtime_ns
+
+    hasher = xxh3_64()
+    with path.open("rb") as f:
+        while chunk := f.read(2**24):
+            hasher.update(chunk)
+
+    return path.resolve().as_posix(), stat.st_size, hasher.hexdigest()
+
+
+def _merge_streams(
+    streams: StreamsConfig | None, other: StreamsConfig | None
+) -> StreamsConfig | None:
+    match streams, other:
+        case None, None:
+            return None
+
+        case dict(), dict() if streams.keys() == other.keys():
+            merged: StreamsConfig = {}
+            for stream_id, stream in streams.items():
+                other_stream = other[stream_id]
+                conflicting = {
+                    input_id
+                    for input_id, source in other_stream.sources.items()
+                    if stream.sources.get(input_id, source) != source
+                }
+
+                if other_stream.index != stream.index or conflicting:
+                    logger.error(
+                        msg := "conflicting stream configs",
+                        stream_id=stream_id,
+                        input_ids=sorted(conflicting),
+                    )
+
+                    raise ValueError(msg)
+
+                merged[stream_id] = StreamConfig(
+                    index=stream.index, sources=stream.sources | other_stream.sources
+                )
+
+            return merged
+
+        case _:
+            logger.error(
+                msg := "stream ids differ",
+                expected=None if streams is None else sorted(streams),
+                actual=None if other is None else sorted(other),
+            )
+
+            raise ValueError(msg)
+
+
+class Dataset(TorchDataset[Batch]):  # noqa: PLR0904, PLW1641
+    __slots__ = (
+        "_data",
+        "_encode_meta",
+        "_indexes",
+        "_input_id_codes",
+        "_input_ids",
+        "_max_stream_workers",
+        "_meta",
+        "_meta_columns",
+        "_meta_ipc",
+        "_metrics",
+        "_source_cache_config",
+        "_stream_executor",
+        "_stream_lock",
+        "_stream_source_cache",
+        "_streams",
+        "_tensor_cache",
+        "_tensor_cache_config",
+        "_tensor_cache_namespaces",
+    )
 
     @validate_call
-    def __init__(
+    def __init__(  # noqa: PLR0913
         self,
         *,
         data: InstanceOf[TensorDict],
         meta: Annotated[InstanceOf[pl.DataFrame], AfterValidator(MetaSchema.validate)],
         streams: StreamsConfig | None,
+        max_stream_workers: PositiveInt | None = None,
+        source_cache: SourceCacheConfig | None = None,
+        tensor_cache: TensorCacheConfig | None = None,
+        encode_meta: bool = False,
+        metrics: bool = False,
     ) -> None:
         super().__init__()
+        self._check_streams(data, streams)
+
+        data = data.auto_batch_size_(1)
+        # memory-mapped tensors are already shared through their backing files
+        if not any(
+            isinstance(value, MemoryMappedTensor)
+            for value in data.values(include_nested=True, leaves_only=True)
+        ):
+            data = data.share_memory_()
+
+        # dictionary-encode `input_id` once, so that batches only gather codes
+        input_id = meta[MetaColumn.input_id]
+        if not isinstance(input_id.dtype, pl.Enum):
+            input_id = input_id.cast(pl.Enum(input_id.unique(maintain_order=True)))
+
+        self._init_state(
+            data=data.lock_(),
+            meta=meta,
+            meta_columns=tuple(meta.columns),
+            input_ids=tuple(input_id.dtype.categories),  # ty: ignore[unresolved-attribute]
+            input_id_codes=(
+                input_id.to_physical().cast(pl.Int32).to_torch().share_memory_()
+            ),
+            streams=streams,
+        )
+        self._init_options(
+            max_stream_workers=max_stream_workers,
+            source_cache=source_cache,
+            tensor_cache=tensor_cache,
+            encode_meta=encode_meta,
+            metrics=metrics,
+        )
+
+    @staticmethod
+    def _check_streams(data: TensorDict, streams: StreamsConfig | None) -> None:
         if streams is not None and (
             missing_stream_indexes := (
                 {stream_config.index for stream_config in streams.values()}
@@ -77,46 +401,168 @@ class Dataset(TorchDataset[Batch]):  # noqa: PLW1641
 
             raise ValueError(msg)
 
-        self._data = data.auto_batch_size_(1).share_memory_().lock_()
+    def _init_state(  # noqa: PLR0913
+        self,
+        *,
+        data: TensorDict,
+        meta: pl.DataFrame | pl.LazyFrame | None,
+        meta_columns: tuple[str, ...],
+        input_ids: tuple[str, ...],
+        input_id_codes: Tensor,
+        streams: StreamsConfig | None,
+        meta_ipc: Tensor | None = None,
+        indexes: Tensor | None = None,
+    ) -> None:
+        self._data = data
+        # a `LazyFrame` (of a sharded dataset) or `None` (an unpickled one, with
+        # `meta_ipc`) is only read when first needed
         self._meta = meta
+        self._meta_columns = meta_columns
+        self._meta_ipc = meta_ipc
+        self._input_ids = input_ids
+        self._input_id_codes = input_id_codes
+        self._indexes = indexes
         self._streams = streams
 
+    def _init_options(
+        self,
+        *,
+        max_stream_workers: PositiveInt | None,
+        source_cache: SourceCacheConfig | None,
+        tensor_cache: TensorCacheConfig | None,
+        encode_meta: bool,
+        metrics: bool,
+    ) -> None:
+        self._encode_meta = encode_meta
+        self._metrics = DatasetMetrics() if metrics else None
+        self._max_stream_workers = max_stream_workers
+        self._stream_executor = None
+        self._source_cache_config = source_cache or SourceCacheConfig()
+        self._tensor_cache_config = tensor_cache
+        self._tensor_cache = None if tensor_cache is None else TensorCache(tensor_cache)
+        self._tensor_cache_namespaces: dict[Hashable, str] = {}
+
         if self._streams is not None:
-            self._stream_source_cache = Cache(maxsize=math.inf)
+            self._stream_source_cache = SourceCache(self._source_cache_config)
+            self._stream_lock = Lock()
 
     @classmethod
     @validate_call
-    def from_config(
+    def from_config(  # noqa: PLR0913
         cls,
         *,
         samples: PipelineInstanceConfig | PipelineHydraConfig,
         streams: StreamsConfig | None = None,
+        max_stream_workers: PositiveInt | None = None,
+        source_cache: SourceCacheConfig | None = None,
+        tensor_cache: TensorCacheConfig | None = None,
+        encode_meta: bool = False,
+        metrics: bool = False,
+        sample_cache: SampleCacheConfig | None = None,
     ) -> Self:
-        sample_df = cls._build_samples(samples)
-        sample_df = MetaSchema.validate(sample_df)
+        data, meta = _split_samples(cls._build_samples(samples, cache=sample_cache))
 
-        data = TensorDict(
-            sample_df.select(pl.exclude(MetaSchema.columns()).to_physical()).to_torch(
-                return_type="dict"
-            )
+        return cls(
+            data=data,
+            meta=meta,
+            streams=streams,
+            max_stream_workers=max_stream_workers,
+            source_cache=source_cache,
+            tensor_cache=tensor_cache,
+            encode_meta=encode_meta,
+            metrics=metrics,
         )
 
-        meta = sample_df.select(MetaSchema.columns()).rechunk()
-
-        return cls(data=data, meta=meta, streams=streams)
-
     @property
     def data(self) -> TensorDict:
-        return self._data
+        # views gather (copy) their rows
+        return (
+            self._data
+            if self._indexes is None
+            else _getitem(self._data, self._indexes, TensorDict)
+        )
 
     @property
     def meta(self) -> pl.DataFrame:
+        return (
+            self._base_meta
+            if self._indexes is None
+            else self._base_meta[self._indexes.numpy()]
+        )
+
+    @property
+    def _base_meta(self) -> pl.DataFrame:
+        match self._meta, self._meta_ipc:
+            case pl.DataFrame(), _:
+                pass
+
+            case pl.LazyFrame(), _:
+                self._meta = self._meta.collect()
+
+            case None, Tensor() as meta_ipc:
+                self._meta = pl.read_ipc(BytesIO(meta_ipc.numpy()))
+
+            case _:
+                raise RuntimeError
+
         return self._meta
 
     @property
     def streams(self) -> StreamsConfig | None:
         return self._streams
 
+    @property
+    def input_ids(self) -> tuple[str, ...]:
+        return self._input_ids
+
+    @property
+    def input_id_codes(self) -> Tensor:
+        # per sample, into `input_ids`
+        return (
+            self._input_id_codes
+            if self._indexes is None
+            else self._input_id_codes[self._indexes]
+        )
+
+    @property
+    def source_cache_info(self) -> SourceCacheInfo | None:
+        if self._streams is None:
+            return None
+
+        hits, misses, _, _ = self._get_source.cache_info()
+
+        return SourceCacheInfo(
+            hits=hits,
+            misses=misses,
+            evictions=self._stream_source_cache.evictions,
+            maxsize=self._stream_source_cache.maxsize,
+            currsize=self._stream_source_cache.currsize,
+        )
+
+    @property
+    def tensor_cache_info(self) -> TensorCacheInfo | None:
+        return None if self._tensor_cache is None else self._tensor_cache.info()
+
+    def collect_metrics(self, *, reset: bool = False) -> MetricsSnapshot | None:
+        # metrics are per process, those of dataloader workers are collected by
+        # `TorchDataNodeDataLoader(collect_metrics=True)`
+        if self._metrics is None:
+            return None
+
+        return self._metrics.snapshot(
+            source_cache=self.source_cache_info,
+            tensor_cache=self.tensor_cache_info,
+            reset=reset,
+        )
+
+    def _timed(
+        self, stage: Stage, stream_id: str | None = None, input_id: str | None = None
+    ) -> AbstractContextManager[None]:
+        if self._metrics is None:
+            return nullcontext()
+
+        return self._metrics.time(MetricsKey(stage, stream_id, input_id))
+
     @override
     def __getitem__(self, index: int) -> Batch:
         return self.get_batch([index])[0]  # ty: ignore[invalid-return-type]
@@ -125,7 +571,41 @@ class Dataset(TorchDataset[Batch]):  # noqa: PLW1641
         return self.get_batch(index)
 
     def __len__(self) -> int:
-        return len(self.data)
+        return len(self._data if self._indexes is None else self._indexes)
+
+    @validate_call
+    def filter(self, *predicates: InstanceOf[pl.Expr]) -> Self:
+        # predicates may reference meta and data columns
+        names = {
+            name for predicate in predicates for name in predicate.meta.root_names()
+        }
+        data = self._data.select(*names.intersection(self._data.keys()))
+        if self._indexes is not None:
+            data = _getitem(data, self._indexes, TensorDict)
+
+        indexes = (
+            self.meta
+            .hstack([pl.Series(k, v.numpy()) for k, v in data.items()])
+            .select(pl.all_horizontal(predicates))
+            .to_series()
+            .arg_true()
+            .cast(pl.Int64)
+            .to_torch()
+        )
+
+        if self._indexes is not None:
+            indexes = self._indexes[indexes]
+
+        # a view: data, input_id codes, meta and stream caches are shared, only
+        # indexes are remapped
+        view = object.__new__(type(self))
+        for name in Dataset.__slots__:
+            with suppress(AttributeError):
+                setattr(view, name, getattr(self, name))
+
+        view._indexes = indexes.share_memory_()  # noqa: SLF001
+
+        return view
 
     def get_batch(
         self,
@@ -134,25 +614,43 @@ class Dataset(TorchDataset[Batch]):  # noqa: PLW1641
         include_streams: bool | None = None,
         include_meta: bool = True,
     ) -> Batch:
-        data = self.data[index]  # ty: ignore[invalid-argument-type]
-        meta = self.meta[index]
+        rows, data, input_id_codes = self._gather(index)
 
         match include_streams, self.streams:
-            case None | True, dict():
-                stream_data = {stream_id: [] for stream_id in self.streams}  # ty: ignore[not-iterable]
+            case None | True, dict() as streams:
+                stream_data = self._get_stream_data(streams, data, input_id_codes)
+                data = self._add_stream_data(data, stream_data)
+
+            case True, None:
+                msg = "`include_streams` is True but no streams specified"
+                raise ValueError(msg)
 
-                for sample, input_id in zip(data, meta["input_id"], strict=True):
-                    for stream_id, stream_config in self.streams.items():  # ty: ignore[possibly-missing-attribute]
-                        stream_index = sample[stream_config.index].tolist()
-                        source = self._get_source(stream_id, input_id)
-                        stream_data[stream_id].append(source[stream_index])
+            case _:
+                pass
+
+        meta = self._get_batch_meta(rows, input_id_codes, include_meta=include_meta)
 
-                stream_data = {k: torch.stack(v) for k, v in stream_data.items()}
+        return Batch(data=data, meta=meta).auto_batch_size_(1)
 
-                if data.is_locked:  # ty: ignore[possibly-missing-attribute]
-                    data = data.clone(recurse=True)  # ty: ignore[unknown-argument]
+    async def aget_batch(
+        self,
+        index: Sequence[int] | InstanceOf[range] | InstanceOf[slice],
+        *,
+        include_streams: bool | None = None,
+        include_meta: bool = True,
+    ) -> Batch:
+        # source reads of all streams and inputs overlap on the stream executor
+        # (`max_stream_workers`) or else the event loop's default one, which bounds
+        # their concurrency across in-flight batches. Cancelling cancels the reads
+        # that have not started yet.
+        rows, data, input_id_codes = self._gather(index)
 
-                data = data.update(stream_data, inplace=False)  # ty: ignore[possibly-missing-attribute]
+        match include_streams, self.streams:
+            case None | True, dict() as streams:
+                stream_data = await self._aget_stream_data(
+                    streams, data, input_id_codes
+                )
+                data = self._add_stream_data(data, stream_data)
 
             case True, None:
                 msg = "`include_streams` is True but no streams specified"
@@ -161,26 +659,423 @@ class Dataset(TorchDataset[Batch]):  # noqa: PLW1641
             case _:
                 pass
 
-        meta = (
-            BatchMeta.from_dict({
-                k: NonTensorStack(*v) for k, v in meta.to_dict().items()
-            })
-            if include_meta
-            else None
-        )
+        meta = self._get_batch_meta(rows, input_id_codes, include_meta=include_meta)
 
         return Batch(data=data, meta=meta).auto_batch_size_(1)
 
-    @cachedmethod(lambda self: self._stream_source_cache)
-    def _get_source(self, stream_id: str, input_id: str) -> TensorSource:
+    def _gather(
+        self, index: Sequence[int] | range | slice
+    ) -> tuple[list[int] | slice | Tensor, TensorDict, Tensor]:
+        with self._timed(Stage.gather):
+            rows = index if isinstance(index, slice) else list(index)
+            if self._indexes is not None:
+                rows = self._indexes[rows]
+
+            data = _getitem(self._data, rows, TensorDict)
+            input_id_codes = self._input_id_codes[rows]
+            # slices are views into the dataset's storage, batches get copies
+            if isinstance(rows, slice):
+                data, input_id_codes = data.clone(), input_id_codes.clone()
+
+        return rows, data, input_id_codes
+
+    @staticmethod
+    def _add_stream_data(
+        data: TensorDict, stream_data: Mapping[str, Tensor]
+    ) -> TensorDict:
+        # a shallow (structure-only) copy: gathered tensors are not copied again
+        data = data.clone(recurse=False).unlock_()
+
+        return data.update(stream_data, inplace=False)
+
+    def _get_batch_meta(
+        self,
+        index: list[int] | slice | Tensor,
+        input_id_codes: Tensor,
+        *,
+        include_meta: bool,
+    ) -> BatchMeta | EncodedBatchMeta | None:
+        with self._timed(Stage.meta):
+            match include_meta, self._encode_meta:
+                case False, _:
+                    return None
+
+                case True, True:
+                    return EncodedBatchMeta(input_id=input_id_codes)
+
+                # decoded from the gathered codes, so that meta is not read
+                case True, False if self._meta_columns == (MetaColumn.input_id,):
+                    return self.decode_meta(EncodedBatchMeta(input_id=input_id_codes))
+
+                case True, False:
+                    return BatchMeta.from_dict({
+                        k: NonTensorStack.from_list(v)
+                        for k, v in self
+                        ._base_meta[
+                            index.numpy() if isinstance(index, Tensor) else index
+                        ]
+                        .to_dict()
+                        .items()
+                    })
+
+    def decode_meta(self, meta: EncodedBatchMeta) -> BatchMeta:
+        input_ids = [self._input_ids[code] for code in meta.input_id.tolist()]
+
+        return BatchMeta.from_dict({
+            MetaColumn.input_id.value: NonTensorStack.from_list(input_ids)
+        })
+
+    def _get_stream_data(
+        self, streams: StreamsConfig, data: TensorDict, input_id_codes: Tensor
+    ) -> dict[str, Tensor]:
+        positions_by_input_id = self._get_positions_by_input_id(input_id_codes)
+        get_stream_batch = partial(
+            self._get_stream_batch, positions_by_input_id=positions_by_input_id
+        )
+        stream_indexes = {
+            stream_id: _getitem(data, stream_config.index, Tensor)
+            for stream_id, stream_config in streams.items()
+        }
+
+        match self._get_stream_executor():
+            case None:
+                return {
+                    stream_id: get_stream_batch(stream_id, indexes=indexes)
+                    for stream_id, indexes in stream_indexes.items()
+                }
+
+            case executor:
+                futures = {
+                    stream_id: executor.submit(
+                        get_stream_batch, stream_id, indexes=indexes
+                    )
+                    for stream_id, indexes in stream_indexes.items()
+                }
+
+                return {
+                    stream_id: future.result() for stream_id, future in futures.items()
+                }
+
+    async def _aget_stream_data(
+        self, streams: StreamsConfig, data: TensorDict, input_id_codes: Tensor
+    ) -> dict[str, Tensor]:
+        loop = asyncio.get_running_loop()
+        executor = self._get_stream_executor()
+        positions_by_input_id = self._get_positions_by_input_id(input_id_codes)
+        stream_reads = {
+            stream_id: (
+                indexes := _getitem(data, stream_config.index, Tensor),
+                self._plan_stream_reads(indexes, positions_by_input_id),
+            )
+            for stream_id, stream_config in streams.items()
+        }
+
+        futures = {
+            (stream_id, input_id): loop.run_in_executor(
+                executor,
+                self._read_source,
+                stream_id,
+                input_id,
+                source_indexes.tolist(),
+            )
+            for stream_id, (_, reads) in stream_reads.items()
+            for input_id, (source_indexes, _) in reads.items()
+        }
+        tensors = dict(
+            zip(futures, await asyncio.gather(*futures.values()), strict=True)
+        )
+
+        stream_data: dict[str, Tensor] = {}
+        for stream_id, (indexes, reads) in stream_reads.items():
+            batch = self._scatter_stream_batch(
+                indexes,
+                positions_by_input_id,
+                reads=reads,
+                tensors={input_id: tensors[stream_id, input_id] for input_id in reads},
+            )
+
+            if self._metrics is not None:
+                self._metrics.add_nbytes(stream_id, batch.nbytes)
+
+            stream_data[stream_id] = batch
+
+        return stream_data
+
+    @validate_call
+    def export_streams(
+        self,
+        path: DirectoryPath | NewPath,
+        *,
+        max_workers: PositiveInt | None = None,
+        chunk_size: PositiveInt = 64,
+    ) -> Self:
+        # decodes every referenced stream tensor once (deduplicated per source) and
+        # returns a dataset reading them from memory-mapped files instead
+        if self._streams is None:
+            logger.error(msg := "streams not specified")
+
+            raise ValueError(msg)
+
+        data = self.data
+        input_id_codes = self.input_id_codes
+        streams: StreamsConfig = {}
+        exports: list[tuple[str, str, Tensor, Path]] = []
+        for stream_id, stream in self._streams.items():
+            stream_indexes = _getitem(data, stream.index, Tensor)
+            sources: dict[str, HydraConfig[TensorSource]] = {}
+            for code, input_id in enumerate(self._input_ids):
+                indexes = stream_indexes[input_id_codes == code].unique()
+                if not len(indexes):
+                    continue
+
+                source_path = path / stream_id / input_id
+                exports.append((stream_id, input_id, indexes, source_path))
+                sources[input_id] = HydraConfig[TensorSource].model_validate({
+                    "_target_": MemmapTensorSource,
+                    "path": source_path.resolve().as_posix(),
+                })
+
+            streams[stream_id] = StreamConfig(index=stream.index, sources=sources)
+
+        with ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=type(self).__name__
+        ) as executor:
+            futures = [
+                executor.submit(self._export_source, *export, chunk_size=chunk_size)
+                for export in exports
+            ]
+            for future in futures:
+                future.result()
+
+        return type(self)(
+            data=data,
+            meta=self.meta,
+            streams=streams,
+            max_stream_workers=self._max_stream_workers,
+            source_cache=self._source_cache_config,
+            tensor_cache=self._tensor_cache_config,
+            encode_meta=self._encode_meta,
+            metrics=self._metrics is not None,
+        )
+
+    def _export_source(
+        self,
+        stream_id: str,
+        input_id: str,
+        indexes: Tensor,
+        path: Path,
+        *,
+        chunk_size: int,
+    ) -> None:
+        path.mkdir(parents=True, exist_ok=True)
+        tensors = None
+        for start in range(0, len(indexes), chunk_size):
+            chunk = indexes[start : start + chunk_size]
+            array = self._read(stream_id, input_id, chunk.tolist()).cpu().numpy()
+            if tensors is None:
+                tensors = np.lib.format.open_memmap(
+                    path / MemmapTensorSource.TENSORS,
+                    mode="w+",
+                    dtype=array.dtype,
+                    shape=(len(indexes), *array.shape[1:]),
+                )
+
+            tensors[start : start + len(chunk)] = array
+
+        if tensors is not None:
+            tensors.flush()
+        np.save(path / MemmapTensorSource.INDEXES, indexes.to(torch.int64).numpy())
+        logger.debug(
+            "exported stream",
+            stream_id=stream_id,
+            input_id=input_id,
+            length=len(indexes),
+        )
+
+    def _get_stream_executor(self) -> ThreadPoolExecutor | None:
+        # created lazily so that each (process) worker gets its own pool
+        with self._stream_lock:
+            if self._stream_executor is None and self._max_stream_workers is not None:
+                self._stream_executor = ThreadPoolExecutor(
+                    max_workers=self._max_stream_workers,
+                    thread_name_prefix=type(self).__name__,
+                )
+
+        return self._stream_executor
+
+    def _get_positions_by_input_id(self, input_id_codes: Tensor) -> dict[str, Tensor]:
+        return {
+            self._input_ids[code]: (input_id_codes == code).nonzero().flatten()
+            for code in input_id_codes.unique().tolist()
+        }
+
+    def _get_stream_batch(
+        self,
+        stream_id: str,
+        *,
+        indexes: Tensor,
+        positions_by_input_id: Mapping[str, Tensor],
+    ) -> Tensor:
+        with self._timed(Stage.stream, stream_id):
+            batch = self._assemble_stream_batch(
+                stream_id, indexes=indexes, positions_by_input_id=positions_by_input_id
+            )
+
+        if self._metrics is not None:
+            self._metrics.add_nbytes(stream_id, batch.nbytes)
+
+        return batch
+
+    def _assemble_stream_batch(
+        self,
+        stream_id: str,
+        *,
+        indexes: Tensor,
+        positions_by_input_id: Mapping[str, Tensor],
+    ) -> Tensor:
+        reads = self._plan_stream_reads(indexes, positions_by_input_id)
+        tensors = {
+            input_id: self._read_source(stream_id, input_id, source_indexes.tolist())
+            for input_id, (source_indexes, _) in reads.items()
+        }
+
+        return self._scatter_stream_batch(
+            indexes, positions_by_input_id, reads=reads, tensors=tensors
+        )
+
+    @staticmethod
+    def _plan_stream_reads(
+        indexes: Tensor, positions_by_input_id: Mapping[str, Tensor]
+    ) -> dict[str, tuple[Tensor, Tensor]]:
+        # one (deduplicated, sorted) source read per input
+        if len(positions_by_input_id) == 1:
+            (input_id,) = positions_by_input_id
+            return {input_id: indexes.unique(return_inverse=True)}
+
+        return {
+            input_id: indexes[positions].unique(return_inverse=True)
+            for input_id, positions in positions_by_input_id.items()
+        }
+
+    @staticmethod
+    def _scatter_stream_batch(
+        indexes: Tensor,
+        positions_by_input_id: Mapping[str, Tensor],
+        *,
+        reads: Mapping[str, tuple[Tensor, Tensor]],
+        tensors: Mapping[str, Tensor],
+    ) -> Tensor:
+        # source reads scattered back into batch order
+        if len(positions_by_input_id) == 1:
+            ((input_id, (source_indexes, inverse)),) = reads.items()
+            tensor = tensors[input_id]
+
+            # already unique and sorted: the read is the batch
+            if source_indexes.numel() == indexes.numel() and inverse.flatten().equal(
+                torch.arange(indexes.numel())
+            ):
+                return tensor.reshape(*indexes.shape, *tensor.shape[1:])
+
+            return tensor[inverse]
+
+        batch: Tensor | None = None
+        for input_id, positions in positions_by_input_id.items():
+            _, inverse = reads[input_id]
+            tensor = tensors[input_id]
+            if batch is None:
+                batch = tensor.new_empty((*indexes.shape, *tensor.shape[1:]))
+
+            batch[positions] = tensor[inverse]
+
+        return batch  # ty: ignore[invalid-return-type]
+
+    def _read_source(
+        self, stream_id: str, input_id: str, indexes: Sequence[int]
+    ) -> Tensor:
+        read = partial(self._read, stream_id, input_id)
+
+        with self._timed(Stage.read, stream_id, input_id):
+            if self._tensor_cache is None:
+                return read(indexes)
+
+            namespace = self._tensor_cache_namespace(stream_id, input_id)
+
+            return self._tensor_cache.get_many(namespace, indexes, read)
+
+    @cachedmethod(cache=lambda self: self._tensor_cache_namespaces)
+    def _tensor_cache_namespace(self, stream_id: str, input_id: str) -> str:
+        # sources are identified by their config and the files it references, so
+        # that entries of since modified files are not reused, rather than by ids
+        source_config = self.streams[stream_id].sources[input_id]  # ty: ignore[not-subscriptable]
+
+        fingerprint = tree_map(
+            _fingerprint_source_value,
+            cast(PyTree[Any], source_config.model_dump(mode="json")),
+        )
+
+        return digest(to_json(fingerprint))
+
+    def _read(self, stream_id: str, input_id: str, indexes: Sequence[int]) -> Tensor:
+        # concurrent (async) batches and exports may share sources, which another
+        # thread can evict (and close) in between getting and pinning them
+        for _ in range(_SOURCE_ATTEMPTS):
+            if (source := self._get_source(stream_id, input_id)).pin():
+                break
+        else:
+            logger.error(
+                msg := "source evicted before it could be read",
+                stream_id=stream_id,
+                input_id=input_id,
+                attempts=_SOURCE_ATTEMPTS,
+            )
+
+            raise RuntimeError(msg)
+
+        try:
+            return source.read(indexes)
+        finally:
+            source.unpin()
+            if not source.cached:
+                source.evict()
+
+            self._stream_source_cache.close_evicted()
+
+    @cachedmethod(
+        cache=lambda self: self._stream_source_cache,
+        lock=lambda self: self._stream_lock,
+        info=True,
+    )
+    def _get_source(self, stream_id: str, input_id: str) -> CachedSource:
         if self.streams is None:
             msg = "streams not specified"
             raise RuntimeError(msg)
 
-        return self.streams[stream_id].sources[input_id].instantiate()
+        with self._timed(Stage.source, stream_id, input_id):
+            return CachedSource(self.streams[stream_id].sources[input_id].instantiate())
 
     @classmethod
     def _build_samples(
+        cls,
+        samples: PipelineInstanceConfig | PipelineHydraConfig,
+        *,
+        cache: SampleCacheConfig | None = None,
+    ) -> pl.DataFrame:
+        if cache is None:
+            return cls._run_pipeline(samples)
+
+        sample_cache = SampleCache(cache)
+        key = _fingerprint_samples(samples, content_hash=cache.content_hash)
+        if (sample_df := sample_cache.get(key)) is not None:
+            logger.debug("reusing cached samples", key=key)
+            return sample_df
+
+        sample_df = cls._run_pipeline(samples)
+        sample_cache.set(key, sample_df)
+
+        return sample_df
+
+    @classmethod
+    def _run_pipeline(
         cls, samples: PipelineInstanceConfig | PipelineHydraConfig
     ) -> pl.DataFrame:
         logger.debug("building samples")
@@ -209,13 +1104,29 @@ class Dataset(TorchDataset[Batch]):  # noqa: PLW1641
         )
 
     @validate_call
-    def save(self, path: DirectoryPath) -> None:
+    def save(
+        self, path: DirectoryPath, *, row_group_size: PositiveInt | None = None
+    ) -> None:
         logger.debug("saving dataset", dataset=self, path=path.resolve().as_posix())
 
-        self._data.memmap(
-            path / "data", copy_existing=True, existsok=True, robust_key=True
+        data, meta = self.data, self.meta
+        if row_group_size is not None:
+            with DatasetWriter(
+                path, row_group_size=row_group_size, streams=self._streams
+            ) as writer:
+                for start in range(0, len(self), row_group_size):
+                    index = slice(start, start + row_group_size)
+                    writer.write(_getitem(data, index, TensorDict), meta[index])
+
+            return
+
+        data.memmap(
+            (path / "data").as_posix(),
+            copy_existing=True,
+            existsok=True,
+            robust_key=True,
         )
-        self._meta.write_parquet(path / "meta.parquet")
+        meta.write_parquet(path / "meta.parquet")
 
         if self._streams is not None:
             streams_json = TypeAdapter(StreamsConfig).dump_json(self._streams)
@@ -224,24 +1135,129 @@ class Dataset(TorchDataset[Batch]):  # noqa: PLW1641
 
     @classmethod
     @validate_call
-    def load(cls, path: DirectoryPath) -> Self:
+    def load(  # noqa: PLR0913
+        cls,
+        path: DirectoryPath,
+        *,
+        max_stream_workers: PositiveInt | None = None,
+        source_cache: SourceCacheConfig | None = None,
+        tensor_cache: TensorCacheConfig | None = None,
+        encode_meta: bool = False,
+        metrics: bool = False,
+    ) -> Self:
         logger.debug("loading dataset", path=path.resolve().as_posix())
-        data = TensorDict.load_memmap(path / "data", robust_key=True)
-        meta = pl.read_parquet(path / "meta.parquet")
-
         try:
             with (path / "streams.json").open() as f:
                 streams = TypeAdapter(StreamsConfig).validate_json(f.read())
         except FileNotFoundError:
             streams = None
 
-        return cls(data=data, meta=meta, streams=streams)
+        options = {
+            "max_stream_workers": max_stream_workers,
+            "source_cache": source_cache,
+            "tensor_cache": tensor_cache,
+            "encode_meta": encode_meta,
+            "metrics": metrics,
+        }
 
-    def __getstate__(self) -> dict[str, Any]:
-        data = self._data
+        if (index_path := path / DatasetWriter.INDEX).exists():
+            return cls._load_sharded(path, index_path, streams=streams, options=options)
+
+        return cls(
+            data=TensorDict.load_memmap(path / "data", robust_key=True),
+            meta=pl.read_parquet(path / "meta.parquet"),
+            streams=streams,
+            **options,
+        )
+
+    @classmethod
+    @validate_call
+    def create(
+        cls,
+        path: DirectoryPath | NewPath,
+        *,
+        samples: PipelineInstanceConfig | PipelineHydraConfig,
+        streams: StreamsConfig | None = None,
+        row_group_size: PositiveInt,
+        sample_cache: SampleCacheConfig | None = None,
+    ) -> None:
+        """Build samples and write them to a sharded dataset, for `Dataset.load`.
+
+        Unlike `from_config` followed by `save`, samples are converted to tensors
+        one row group at a time, never all at once.
+        """
+        with DatasetWriter(
+            path, row_group_size=row_group_size, streams=streams
+        ) as writer:
+            writer.write_samples(cls._build_samples(samples, cache=sample_cache))
+
+    @classmethod
+    @validate_call
+    def append(
+        cls,
+        path: DirectoryPath,
+        *,
+        samples: PipelineInstanceConfig | PipelineHydraConfig,
+        streams: StreamsConfig | None = None,
+    ) -> None:
+        """Build samples for new inputs only and append them to a sharded dataset."""
+        with DatasetWriter.reopen(path, streams=streams) as writer:
+            writer.write_samples(cls._build_samples(samples))
+
+    @classmethod
+    def _load_sharded(
+        cls,
+        path: Path,
+        index_path: Path,
+        *,
+        streams: StreamsConfig | None,
+        options: dict[str, Any],
+    ) -> Self:
+        index = _ShardedIndex.model_validate_json(index_path.read_bytes())
+
+        # files are mapped, not read: only the pages of touched rows get loaded
+        data = TensorDict(
+            {
+                column.key: MemoryMappedTensor.from_filename(
+                    DatasetWriter.data_path(path, i),
+                    dtype=getattr(torch, column.dtype),
+                    shape=torch.Size((index.length, *column.shape)),
+                )
+                for i, column in enumerate(index.columns)
+            },
+            batch_size=[index.length],
+        )
 
-        meta = BytesIO()
-        self._meta.write_parquet(meta)
+        cls._check_streams(data, streams)
+
+        # written by `DatasetWriter` already, so not validated (or read) again:
+        # `input_id`s are dictionary-encoded on disk, meta is read when first needed
+        dataset = cls.__new__(cls)
+        dataset._init_state(  # noqa: SLF001
+            data=data.lock_(),
+            meta=DatasetWriter.scan_meta(path, index),
+            meta_columns=tuple(index.meta_columns),
+            input_ids=tuple(index.input_ids),
+            input_id_codes=DatasetWriter.read_input_id_codes(path, index.length),
+            streams=streams,
+        )
+        dataset._init_options(**options)  # noqa: SLF001
+
+        return dataset
+
+    def __getstate__(self) -> dict[str, Any]:
+        # meta is shared once as an Arrow IPC buffer in shared memory, so that
+        # (process) workers attach to it instead of each re-parsing a copy. Meta
+        # not read yet is passed on as is (a plan, not data)
+        if self._meta_ipc is None and not isinstance(self._meta, pl.LazyFrame):
+            buffer = BytesIO()
+            self._base_meta.write_ipc(buffer)
+            self._meta_ipc = (
+                torch
+                .frombuffer(buffer.getbuffer(), dtype=torch.uint8)
+                .clone()
+                .share_memory_()
+            )
 
         streams = (
             TypeAdapter(StreamsConfig).dump_json(self._streams)
@@ -249,15 +1265,42 @@ class Dataset(TorchDataset[Batch]):  # noqa: PLW1641
             else None
         )
 
-        return {"data": data, "meta": meta, "streams": streams}
+        return {
+            "data": self._data,
+            "meta": self._meta if isinstance(self._meta, pl.LazyFrame) else None,
+            "meta_columns": self._meta_columns,
+            "meta_ipc": self._meta_ipc,
+            "input_ids": self._input_ids,
+            "input_id_codes": self._input_id_codes,
+            "indexes": self._indexes,
+            "streams": streams,
+            "options": {
+                "max_stream_workers": self._max_stream_workers,
+                "source_cache": self._source_cache_config,
+                "tensor_cache": self._tensor_cache_config,
+                "encode_meta": self._encode_meta,
+                "metrics": self._metrics is not None,
+            },
+        }
 
     def __setstate__(self, state: dict[str, Any]) -> None:
-        state["meta"] = pl.read_parquet(state["meta"])
-
-        if (v := state[k := "streams"]) is not None:
-            state[k] = TypeAdapter(StreamsConfig).validate_json(v)
-
-        self.__init__(**state)
+        # everything was validated (and shared) by the pickling process already,
+        # so attach to it rather than going through `__init__` again
+        self._init_state(
+            data=state["data"],
+            meta=state["meta"],
+            meta_columns=state["meta_columns"],
+            meta_ipc=state["meta_ipc"],
+            input_ids=state["input_ids"],
+            input_id_codes=state["input_id_codes"],
+            indexes=state["indexes"],
+            streams=(
+                TypeAdapter(StreamsConfig).validate_json(v)
+                if (v := state["streams"]) is not None
+                else None
+            ),
+        )
+        self._init_options(**state["options"])
 
     def __eq__(self, other: object) -> bool:
         if not isinstance(other, Dataset):
@@ -268,3 +1311,338 @@ class Dataset(TorchDataset[Batch]):  # noqa: PLW1641
             self.meta.equals(other.meta),
             self.streams == other.streams,
         ))
+
+
+class DatasetWriter:
+    """Incrementally writes a `Dataset` in fixed-size row groups.
+
+    Each data column (and the dictionary-encoded `input_id`) is appended to a flat
+    file, which `Dataset.load` memory-maps, while meta gets one parquet file per row
+    group, only read when first needed. Only a single row group is ever held in
+    memory, so samples can be written as they are being built.
+    """
+
+    INDEX = "index.json"
+
+    __slots__ = (
+        "_columns",
+        "_committed",
+        "_existing_input_ids",
+        "_files",
+        "_input_id_codes_file",
+        "_input_id_enum",
+        "_input_ids",
+        "_length",
+        "_meta_columns",
+        "_path",
+        "_pending",
+        "_row_group_size",
+        "_row_groups",
+        "_streams",
+    )
+
+    @validate_call
+    def __init__(
+        self,
+        path: DirectoryPath | NewPath,
+        *,
+        row_group_size: PositiveInt,
+        streams: StreamsConfig | None = None,
+    ) -> None:
+        (path / "data").mkdir(parents=True, exist_ok=True)
+        (path / "meta").mkdir(exist_ok=True)
+
+        self._path = path
+        self._row_group_size = row_group_size
+        self._streams = streams
+        self._columns: dict[tuple[str, ...], _ShardedColumn] = {}
+        self._meta_columns: list[str] = [MetaColumn.input_id]
+        self._files: dict[tuple[str, ...], BinaryIO] = {}
+        self._pending: list[tuple[TensorDict, pl.DataFrame]] = []
+        self._input_id_codes_file: BinaryIO | None = None
+        self._input_ids: dict[str, int] = {}
+        self._input_id_enum: bool | None = None
+        self._existing_input_ids: frozenset[str] = frozenset()
+        self._length = 0
+        self._row_groups = 0
+        # (length, row_groups, input_ids) as of the last index written
+        self._committed = (0, 0, 0)
+
+    @classmethod
+    @validate_call
+    def reopen(cls, path: DirectoryPath, *, streams: StreamsConfig | None) -> Self:
+        # existing row groups are left untouched, new rows start a new row group
+        if not (index_path := path / cls.INDEX).exists():
+            logger.error(
+                msg := "not a sharded dataset, save it with `row_group_size`",
+                path=path.resolve().as_posix(),
+            )
+
+            raise ValueError(msg)
+
+        index = _ShardedIndex.model_validate_json(index_path.read_bytes())
+
+        try:
+            with (path / "streams.json").open() as f:
+                existing_streams = TypeAdapter(StreamsConfig).validate_json(f.read())
+        except FileNotFoundError:
+            existing_streams = None
+
+        writer = cls(
+            path,
+            row_group_size=index.row_group_size,
+            streams=_merge_streams(existing_streams, streams),
+        )
+        writer._columns = {column.key: column for column in index.columns}
+        writer._meta_columns = index.meta_columns
+        writer._input_ids = {
+            input_id: code for code, input_id in enumerate(index.input_ids)
+        }
+        writer._input_id_enum = index.input_id_enum if index.length else None
+        writer._length = index.length
+        writer._row_groups = index.row_groups
+        writer._committed = (index.length, index.row_groups, len(index.input_ids))
+        # drop rows of an earlier writer that failed (or was killed) before closing
+        writer._rollback()
+        # from the codes, so that meta is not read
+        writer._existing_input_ids = frozenset(
+            index.input_ids[code]
+            for code in np.unique(
+                cls.read_input_id_codes(path, index.length).numpy()
+            ).tolist()
+        )
+
+        return writer
+
+    @staticmethod
+    def data_path(path: Path, column: int) -> Path:
+        return path / "data" / f"{column}.bin"
+
+    @staticmethod
+    def meta_path(path: Path, row_group: int) -> Path:
+        return path / "meta" / f"{row_group:08d}.parquet"
+
+    @staticmethod
+    def input_id_codes_path(path: Path) -> Path:
+        return path / "input_id.bin"
+
+    @classmethod
+    def scan_meta(cls, path: Path, index: _ShardedIndex) -> pl.LazyFrame:
+        dtype = pl.Enum(index.input_ids) if index.input_id_enum else pl.String
+        if not index.row_groups:
+            return pl.LazyFrame(schema={MetaColumn.input_id: dtype})
+
+        return pl.scan_parquet([
+            cls.meta_path(path, i) for i in range(index.row_groups)
+        ]).with_columns(pl.col(MetaColumn.input_id).cast(dtype))
+
+    @classmethod
+    def read_input_id_codes(cls, path: Path, length: int) -> Tensor:
+        if not length:
+            return torch.empty(0, dtype=torch.int32)
+
+        return MemoryMappedTensor.from_filename(
+            cls.input_id_codes_path(path),
+            dtype=torch.int32,
+            shape=torch.Size((length,)),
+        )
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self._close_files()
+            self._rollback()
+
+    def write_samples(self, samples: pl.DataFrame) -> None:
+        # converted per row group, so that only one is ever held as tensors
+        for row_group in samples.iter_slices(self._row_group_size):
+            self.write(*_split_samples(row_group))
+
+    def write(self, data: TensorDict, meta: pl.DataFrame) -> None:
+        data = data.auto_batch_size_(1)
+        if len(data) != len(meta):
+            logger.error(
+                msg := "`data` and `meta` lengths differ",
+                data=len(data),
+                meta=len(meta),
+            )
+
+            raise ValueError(msg)
+
+        if existing := self._existing_input_ids.intersection(
+            meta[MetaColumn.input_id].unique()
+        ):
+            logger.error(
+                msg := "`input_id`s already written", input_ids=sorted(existing)
+            )
+
+            raise ValueError(msg)
+
+        self._pending.append((data, meta))
+
+        while sum(len(meta) for _, meta in self._pending) >= self._row_group_size:
+            self._flush()
+
+    def close(self) -> None:
+        if self._pending:
+            self._flush()
+
+        self._close_files()
+
+        if self._streams is not None:
+            self._replace(
+                self._path / "streams.json",
+                TypeAdapter(StreamsConfig).dump_json(self._streams),
+            )
+
+        # last, so that it only ever describes rows (and streams) fully written
+        index = _ShardedIndex(
+            length=self._length,
+            row_group_size=self._row_group_size,
+            row_groups=self._row_groups,
+            columns=list(self._columns.values()),
+            meta_columns=self._meta_columns,
+            input_ids=list(self._input_ids),
+            input_id_enum=bool(self._input_id_enum),
+        )
+        self._replace(self._path / self.INDEX, index.model_dump_json().encode())
+        self._committed = (self._length, self._row_groups, len(self._input_ids))
+
+    @staticmethod
+    def _replace(path: Path, content: bytes) -> None:
+        with temporary_path(path) as path_tmp:
+            path_tmp.write_bytes(content)
+            path_tmp.replace(path)
+
+    def _close_files(self) -> None:
+        for file in self._files.values():
+            file.close()
+
+        self._files.clear()
+
+        if self._input_id_codes_file is not None:
+            self._input_id_codes_file.close()
+            self._input_id_codes_file = None
+
+    def _flush(self) -> None:
+        data: TensorDict = TensorDict.cat([data for data, _ in self._pending])
+        meta = pl.concat([meta for _, meta in self._pending])
+        size = self._row_group_size
+        self._pending = (
+            [(_getitem(data, slice(size, None), TensorDict), meta[size:])]
+            if len(meta) > size
+            else []
+        )
+        data, meta = _getitem(data, slice(size), TensorDict), meta[:size]
+
+        columns = {
+            key if isinstance(key, tuple) else (key,): _getitem(data, key, Tensor)
+            for key in data.keys(include_nested=True, leaves_only=True)
+        }
+
+        if self._columns and columns.keys() != self._columns.keys():
+            logger.error(
+                msg := "columns differ between row groups",
+                expected=sorted(self._columns),
+                actual=sorted(columns),
+            )
+
+            raise ValueError(msg)
+
+        # all columns are validated before any of them is written to
+        for key, value in columns.items():
+            column = _ShardedColumn(
+                key=key,
+                dtype=str(value.dtype).removeprefix("torch."),
+                shape=value.shape[1:],
+            )
+
+            if (expected := self._columns.get(key, column)) != column:
+                logger.error(
+                    msg := "column schema differs between row groups",
+                    expected=expected,
+                    actual=column,
+                )
+
+                raise ValueError(msg)
+
+            self._columns[key] = column
+
+        for key, value in columns.items():
+            if (file := self._files.get(key)) is None:
+                path = self.data_path(self._path, list(self._columns).index(key))
+                # rows already written (if reopened) are appended to, never rewritten
+                file = self._files[key] = path.open("ab" if self._length else "wb")
+
+            value.contiguous().numpy().tofile(file)
+
+        self._write_input_id_codes(meta[MetaColumn.input_id])
+        self._meta_columns = meta.columns
+
+        # `Enum` categories may differ between row groups, plain strings never do.
+        # `Dataset.load` casts them back to an `Enum` of all codes' categories
+        meta = meta.with_columns(pl.col(MetaColumn.input_id).cast(pl.String))
+        meta.write_parquet(self.meta_path(self._path, self._row_groups))
+        self._row_groups += 1
+        self._length += len(meta)
+
+    def _write_input_id_codes(self, input_id: pl.Series) -> None:
+        # categories are numbered as `Dataset` numbers them, so that codes (and the
+        # `Enum` dtype) are the same as those of an unsharded dataset
+        match dtype := input_id.dtype:
+            case pl.Enum():
+                categories = dtype.categories
+
+            case _:
+                categories = input_id.unique(maintain_order=True)
+
+        if self._input_id_enum is None:
+            self._input_id_enum = isinstance(dtype, pl.Enum)
+
+        for category in categories:
+            self._input_ids.setdefault(category, len(self._input_ids))
+
+        if self._input_id_codes_file is None:
+            self._input_id_codes_file = self.input_id_codes_path(self._path).open(
+                "ab" if self._length else "wb"
+            )
+
+        (
+            input_id
+            .cast(pl.String)
+            .replace_strict(self._input_ids, return_dtype=pl.Int32)
+            .to_numpy()
+            .tofile(self._input_id_codes_file)
+        )
+
+    def _rollback(self) -> None:
+        # truncates data files and removes meta files to the last index written
+        length, row_groups, input_ids = self._committed
+        for i, column in enumerate(self._columns.values()):
+            with suppress(FileNotFoundError):
+                os.truncate(self.data_path(self._path, i), length * column.row_nbytes)
+
+        with suppress(FileNotFoundError):
+            os.truncate(
+                self.input_id_codes_path(self._path), length * torch.int32.itemsize
+            )
+
+        self._input_ids = dict(islice(self._input_ids.items(), input_ids))
+
+        for row_group in range(row_groups, self._row_groups):
+            self.meta_path(self._path, row_group).unlink(missing_ok=True)
+
+        if not length:
+            self._columns.clear()
+            self._input_id_enum = None
+
+        self._length, self._row_groups = length, row_groups
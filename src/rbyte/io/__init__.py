@@ -6,6 +6,7 @@ from .dataframe import (
     DataFrameGroupByDynamic,
     DataFrameIndexer,
 )
+from .memmap import MemmapTensorSource
 from .path import PathDataFrameBuilder, PathTensorSource
 from .tree import TreeBroadcastMapper
 
@@ -15,6 +16,7 @@ __all__: list[str] = [
     "DataFrameGroupByDynamic",
     "DataFrameIndexer",
     "DuckDBDataFrameQuery",
+    "MemmapTensorSource",
     "NumpyTensorSource",
     "PathDataFrameBuilder",
     "PathTensorSource",
@@ -31,6 +33,7 @@ else:
 
 try:  # noqa: RUF067
     from ._mcap import (
+        BatchMcapDecoderFactory,
         JsonMcapDecoderFactory,
         McapDataFrameBuilder,
         McapTensorSource,
@@ -40,6 +43,7 @@ except ImportError:
     pass
 else:
     __all__ += [
+        "BatchMcapDecoderFactory",
         "JsonMcapDecoderFactory",
         "McapDataFrameBuilder",
         "McapTensorSource",
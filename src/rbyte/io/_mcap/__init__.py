@@ -1,8 +1,13 @@
 from .dataframe_builder import McapDataFrameBuilder
-from .decoders import JsonMcapDecoderFactory, ProtobufMcapDecoderFactory
+from .decoders import (
+    BatchMcapDecoderFactory,
+    JsonMcapDecoderFactory,
+    ProtobufMcapDecoderFactory,
+)
 from .tensor_source import McapTensorSource
 
 __all__ = [
+    "BatchMcapDecoderFactory",
     "JsonMcapDecoderFactory",
     "McapDataFrameBuilder",
     "McapTensorSource",
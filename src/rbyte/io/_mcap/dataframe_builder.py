@@ -6,19 +6,23 @@ from mmap import ACCESS_READ, mmap
 from operator import attrgetter
 from os import PathLike
 from pathlib import Path
-from typing import NamedTuple, final
+from typing import Any, NamedTuple, final
 
 import more_itertools as mit
+import numpy as np
 import polars as pl
 import polars.selectors as cs
 from mcap.decoder import DecoderFactory
 from mcap.reader import SeekingReader
+from mcap.records import Channel, Schema
 from polars.datatypes import DataType
 from pydantic import ImportString, InstanceOf, validate_call
 from structlog import get_logger
 from structlog.contextvars import bound_contextvars
 from tqdm import tqdm
 
+from .decoders import BatchMcapDecoderFactory
+
 logger = get_logger(__name__)
 
 
@@ -36,6 +40,10 @@ class SpecialField(StrEnum):
     publish_time = "publish_time"
 
 
+# buffer keys of raw message payloads and their read order
+_DATA, _INDEX = "_data", "_index"
+
+
 @final
 class McapDataFrameBuilder:
     __name__ = __qualname__
@@ -94,60 +102,116 @@ class McapDataFrameBuilder:
                 else None
             )
 
-            rows: dict[str, list[pl.DataFrame]] = defaultdict(list)
-
-            for dmt in tqdm(
-                reader.iter_decoded_messages(topics),
-                desc="messages",
-                total=message_count,
+            # raw payloads are only kept for topics requesting message fields
+            decoded_topics = {
+                topic
+                for topic in topics
+                if any(field not in SpecialField for field in self._fields[topic])
+            }
+
+            # raw payloads and special fields, decoded in bulk per channel
+            buffers: dict[int, dict[str, list[Any]]] = {}
+            for idx, (_, channel, message) in enumerate(
+                tqdm(reader.iter_messages(topics), desc="messages", total=message_count)
             ):
-                schema = self._fields[dmt.channel.topic]
-                message_fields, special_fields = map(
-                    dict,  # ty:ignore[invalid-argument-type]
-                    mit.partition(lambda kv: kv[0] in SpecialField, schema.items()),
+                if (buffer := buffers.get(channel.id)) is None:
+                    buffer = buffers[channel.id] = defaultdict(list)
+
+                buffer[_INDEX].append(idx)
+                if channel.topic in decoded_topics:
+                    buffer[_DATA].append(message.data)
+
+                for field in SpecialField:
+                    buffer[field].append(getattr(message, field))
+
+            dfs: dict[str, list[pl.DataFrame]] = defaultdict(list)
+            indexes: dict[str, list[list[int]]] = defaultdict(list)
+            for channel_id, buffer in buffers.items():
+                channel = summary.channels[channel_id]
+                dfs[channel.topic].append(
+                    self._build_channel_df(
+                        channel, summary.schemas.get(channel.schema_id), buffer
+                    )
                 )
-
-                row_df = pl.DataFrame(
-                    [getattr(dmt.message, field) for field in special_fields],
-                    schema=special_fields,
+                indexes[channel.topic].append(buffer[_INDEX])
+
+        result: dict[str, pl.DataFrame] = {}
+        for topic, topic_dfs in dfs.items():
+            df = pl.concat(topic_dfs, how="vertical", rechunk=True)
+            # restore the read order of topics spanning several channels
+            if len(topic_dfs) > 1:
+                order = np.argsort(np.concatenate(indexes[topic]), kind="stable")
+                df = df[order]
+
+            result[topic] = df
+
+        return result
+
+    def _build_channel_df(
+        self, channel: Channel, schema: Schema | None, buffer: dict[str, list[Any]]
+    ) -> pl.DataFrame:
+        message_fields, special_fields = map(
+            dict,
+            mit.partition(
+                lambda kv: kv[0] in SpecialField, self._fields[channel.topic].items()
+            ),
+        )
+
+        df = pl.DataFrame(
+            {field: buffer[field] for field in special_fields}, schema=special_fields
+        )
+
+        # only decode messages if any of their fields are requested
+        if message_fields:
+            messages = self._decode(channel, schema, buffer[_DATA])
+            df = self._build_message_df(messages, message_fields).hstack(df)
+
+        return df
+
+    def _decode(
+        self, channel: Channel, schema: Schema | None, payloads: list[bytes]
+    ) -> pl.DataFrame | list[object]:
+        for factory in self._decoder_factories_instantiated:
+            if isinstance(factory, BatchMcapDecoderFactory) and (
+                batch_decoder := factory.batch_decoder_for(
+                    channel.message_encoding, schema
                 )
+            ):
+                return batch_decoder(payloads)
 
-                if (
-                    message_df := self._build_message_df(
-                        dmt.decoded_message, message_fields
-                    )
-                ) is not None:
-                    row_df = message_df.hstack(row_df)
+            if decoder := factory.decoder_for(channel.message_encoding, schema):
+                messages = [decoder(payload) for payload in payloads]
+
+                return (
+                    pl.concat(messages, how="diagonal_relaxed")
+                    if messages and isinstance(messages[0], pl.DataFrame)
+                    else messages
+                )
 
-                rows[dmt.channel.topic].append(row_df)
+        logger.error(msg := "missing message decoder", topic=channel.topic)
 
-        return {
-            topic: pl.concat(row_dfs, how="vertical", rechunk=True)
-            for topic, row_dfs in rows.items()
-        }
+        raise RuntimeError(msg)
 
     @staticmethod
     def _build_message_df(
-        message: object, fields: dict[str, DataType | None]
-    ) -> pl.DataFrame | None:
-        if not fields:
-            return None
-
+        messages: pl.DataFrame | list[object], fields: dict[str, DataType | None]
+    ) -> pl.DataFrame:
         df_schema = {name: dtype for name, dtype in fields.items() if dtype is not None}
 
-        match message:
+        match messages:
             case pl.DataFrame():
                 return (
-                    message
+                    messages
                     .lazy()
                     .unnest(cs.struct(), separator=".")
                     .select(fields.keys())
                     .cast(df_schema)
-                ).collect()  # ty:ignore[invalid-return-type]
+                ).collect()
 
             case _:
                 return pl.from_dict({
-                    field: attrgetter(field)(message) for field in fields
+                    field: [attrgetter(field)(message) for message in messages]
+                    for field in fields
                 }).cast(df_schema)
 
     @cached_property
@@ -1,4 +1,9 @@
+from .batch import BatchMcapDecoderFactory
 from .json_decoder_factory import JsonMcapDecoderFactory
 from .protobuf_decoder_factory import ProtobufMcapDecoderFactory
 
-__all__ = ["JsonMcapDecoderFactory", "ProtobufMcapDecoderFactory"]
+__all__ = [
+    "BatchMcapDecoderFactory",
+    "JsonMcapDecoderFactory",
+    "ProtobufMcapDecoderFactory",
+]
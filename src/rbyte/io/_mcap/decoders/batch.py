@@ -0,0 +1,14 @@
+from collections.abc import Callable, Sequence
+from typing import Protocol, runtime_checkable
+
+import polars as pl
+from mcap.records import Schema
+
+
+@runtime_checkable
+class BatchMcapDecoderFactory(Protocol):
+    """A `DecoderFactory` that also decodes many messages of a channel at once."""
+
+    def batch_decoder_for(
+        self, message_encoding: str, schema: Schema | None
+    ) -> Callable[[Sequence[bytes]], pl.DataFrame] | None: ...
@@ -1,4 +1,4 @@
-from collections.abc import Callable
+from collections.abc import Callable, Sequence
 from typing import override
 
 import polars as pl
@@ -22,3 +22,20 @@ class JsonMcapDecoderFactory(McapDecoderFactory):
             return pl.read_json
 
         return None
+
+    def batch_decoder_for(
+        self, message_encoding: str, schema: Schema | None
+    ) -> Callable[[Sequence[bytes]], pl.DataFrame] | None:
+        if self.decoder_for(message_encoding, schema) is None:
+            return None
+
+        return self._decode_batch
+
+    @staticmethod
+    def _decode_batch(data: Sequence[bytes]) -> pl.DataFrame:
+        if not data:
+            return pl.DataFrame()
+
+        # an array of objects reads as one row per object, with the schema inferred
+        # from all of them (fields may be missing from, or widen in, later messages)
+        return pl.read_json(b"[" + b",".join(data) + b"]", infer_schema_length=None)
@@ -1,4 +1,4 @@
-from collections.abc import Callable
+from collections.abc import Callable, Sequence
 from operator import attrgetter
 from typing import override
 
@@ -31,6 +31,16 @@ class ProtobufMcapDecoderFactory(McapDecoderFactory):
     def decoder_for(
         self, message_encoding: str, schema: Schema | None
     ) -> Callable[[bytes], pl.DataFrame] | None:
+        match self.batch_decoder_for(message_encoding, schema):
+            case None:
+                return None
+
+            case batch_decoder:
+                return lambda data: batch_decoder([data])
+
+    def batch_decoder_for(
+        self, message_encoding: str, schema: Schema | None
+    ) -> Callable[[Sequence[bytes]], pl.DataFrame] | None:
         if (
             message_encoding == MessageEncoding.Protobuf
             and schema is not None
@@ -39,8 +49,9 @@ class ProtobufMcapDecoderFactory(McapDecoderFactory):
             message_type = self._get_message_type(schema)
             handler = self._handler_pool.get_for_message(message_type.DESCRIPTOR)
 
-            def decoder(data: bytes) -> pl.DataFrame:
-                record_batch = handler.list_to_record_batch([data])
+            # a single conversion for all messages
+            def decoder(data: Sequence[bytes]) -> pl.DataFrame:
+                record_batch = handler.list_to_record_batch(list(data))
                 return pl.from_arrow(record_batch, rechunk=False)  # ty: ignore[invalid-return-type]
 
             return decoder
@@ -1,46 +1,77 @@
-from collections.abc import Callable, Iterable, Sequence
-from dataclasses import dataclass
+import struct
+from collections.abc import Callable, Hashable, Iterable, Sequence
 from functools import cached_property
+from itertools import chain
 from mmap import ACCESS_READ, mmap
 from operator import itemgetter
-from typing import IO, final, override
+from pathlib import Path
+from typing import IO, NamedTuple, final, override
 
 import more_itertools as mit
+import numpy as np
 import numpy.typing as npt
 import torch
+from cachetools import LRUCache, cachedmethod
 from mcap.data_stream import ReadDataStream
 from mcap.decoder import DecoderFactory
 from mcap.opcode import Opcode
 from mcap.reader import SeekingReader
 from mcap.records import Channel, Chunk, ChunkIndex, Message
+from mcap.records import MessageIndex as McapMessageIndex
 from mcap.stream_reader import get_chunk_data_stream
-from pydantic import FilePath, ImportString, validate_call
+from pydantic import (
+    ByteSize,
+    DirectoryPath,
+    FilePath,
+    ImportString,
+    NewPath,
+    validate_call,
+)
 from structlog import get_logger
 from structlog.contextvars import bound_contextvars
 from torch import Tensor
+from xxhash import xxh3_64_hexdigest
 
-from rbyte.types import TensorSource
+from rbyte.types import ManagedTensorSource, SourceResources
+from rbyte.utils import temporary_path
+
+from .decoders import BatchMcapDecoderFactory
 
 logger = get_logger(__name__)
 
+# chunks are cached across calls only on request
+_CHUNK_CACHE_SIZE = ByteSize(0)
+
+# message index columns: chunk start offset in the file, and message record offset
+# within the decompressed chunk
+CHUNK_START_OFFSET, RECORD_OFFSET = 0, 1
+
+# record: opcode (1), length (8), then for messages: channel id (2), sequence (4),
+# log time (8), publish time (8), data
+_RECORD_HEADER_LENGTH = 1 + 8
+_MESSAGE_HEADER_LENGTH = 2 + 4 + 8 + 8
+
 
-@dataclass(frozen=True)
-class MessageIndex:
-    chunk_start_offset: int
-    message_start_offset: int
-    message_length: int
+class ChunkCacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
 
 
 @final
-class McapTensorSource(TensorSource[int]):
+class McapTensorSource(ManagedTensorSource[int]):
     @validate_call
-    def __init__(
+    def __init__(  # noqa: PLR0913
         self,
         path: FilePath,
         topic: str,
         decoder_factory: ImportString[type[DecoderFactory]],
         decoder: Callable[[bytes], npt.ArrayLike],
         validate_crcs: bool = False,  # noqa: FBT001, FBT002
+        *,
+        chunk_cache_size: ByteSize = _CHUNK_CACHE_SIZE,
+        index_dir: DirectoryPath | NewPath | None = None,
     ) -> None:
         super().__init__()
 
@@ -65,9 +96,10 @@ class McapTensorSource(TensorSource[int]):
                 if channel.topic == topic
             )
 
-            message_decoder = decoder_factory().decoder_for(
-                message_encoding=self._channel.message_encoding,
-                schema=summary.schemas[self._channel.schema_id],
+            factory = decoder_factory()
+            schema = summary.schemas[self._channel.schema_id]
+            message_decoder = factory.decoder_for(
+                message_encoding=self._channel.message_encoding, schema=schema
             )
 
             if message_decoder is None:
@@ -75,13 +107,30 @@ class McapTensorSource(TensorSource[int]):
                 raise RuntimeError(msg)
 
             self._message_decoder = message_decoder
+            self._batch_message_decoder = (
+                factory.batch_decoder_for(
+                    message_encoding=self._channel.message_encoding, schema=schema
+                )
+                if isinstance(factory, BatchMcapDecoderFactory)
+                else None
+            )
+            # chunks without message indexes may contain the channel too
             self._chunk_indexes = tuple(
                 chunk_index
                 for chunk_index in summary.chunk_indexes
                 if self._channel.id in chunk_index.message_index_offsets
+                or not chunk_index.message_index_offsets
             )
+            # message index sidecars are only written on request, and never next to
+            # the (possibly read-only or shared) data
+            self._index_dir = index_dir
             self._decoder = decoder
             self._mmap = None
+            # decompressed chunks, shared by reads of neighbouring messages across
+            # calls (within a call, each chunk is decompressed once regardless)
+            self._chunk_cache = LRUCache[Hashable, bytes](
+                maxsize=chunk_cache_size, getsizeof=len
+            )
 
     @property
     def _file(self) -> mmap:
@@ -102,63 +151,163 @@ class McapTensorSource(TensorSource[int]):
     def __getitem__(self, indexes: int | Sequence[int]) -> Tensor:
         match indexes:
             case Sequence():
-                arrays: dict[int, npt.ArrayLike] = {}
-                message_indexes = (self._message_indexes[idx] for idx in indexes)  # ty:ignore[invalid-argument-type]
-                indexes_by_chunk_start_offset = mit.map_reduce(
-                    zip(indexes, message_indexes, strict=True),
-                    keyfunc=lambda x: x[1].chunk_start_offset,
+                message_indexes = self._message_indexes[np.asarray(indexes)]
+                # visit each chunk once
+                order = np.argsort(
+                    message_indexes[:, CHUNK_START_OFFSET], kind="stable"
                 )
-
-                for chunk_start_offset, chunk_indexes in sorted(
-                    indexes_by_chunk_start_offset.items(), key=itemgetter(0)
+                payloads: list[bytes] = [b""] * len(indexes)
+                chunk_offset, chunk = None, b""
+                for i, (chunk_start_offset, record_offset) in zip(
+                    order.tolist(), message_indexes[order].tolist(), strict=True
                 ):
-                    _ = self._file.seek(chunk_start_offset + 1 + 8)
-                    chunk = Chunk.read(ReadDataStream(self._file))  # ty: ignore[invalid-argument-type]
-                    stream, _ = get_chunk_data_stream(
-                        chunk, validate_crc=self._validate_crcs
-                    )
-                    for index, message_index in sorted(
-                        chunk_indexes, key=lambda x: x[1].message_start_offset
-                    ):
-                        stream.read(message_index.message_start_offset - stream.count)
-                        message = Message.read(stream, message_index.message_length)
-                        decoded_message = self._message_decoder(message.data)
-                        arrays[index] = self._decoder(decoded_message.data)
+                    if chunk_start_offset != chunk_offset:
+                        chunk_offset = chunk_start_offset
+                        chunk = self._read_chunk(chunk_start_offset)
 
-                tensors = [torch.from_numpy(arrays[idx]) for idx in indexes]  # ty: ignore[invalid-argument-type]
+                    payloads[i] = self._read_payload(chunk, record_offset)
 
-                return torch.stack(tensors)
+                return torch.stack([
+                    torch.from_numpy(self._decoder(data))
+                    for data in self._decode(payloads)
+                ])
 
             case int():
-                message_index = self._message_indexes[indexes]
-                _ = self._file.seek(message_index.chunk_start_offset + 1 + 8)
-                chunk = Chunk.read(ReadDataStream(self._file))  # ty: ignore[invalid-argument-type]
-                stream, _ = get_chunk_data_stream(chunk, self._validate_crcs)
-                _ = stream.read(message_index.message_start_offset - stream.count)
-                message = Message.read(stream, length=message_index.message_length)
-                decoded_message = self._message_decoder(message.data)
-                array = self._decoder(decoded_message.data)
+                chunk_start_offset, record_offset = self._message_indexes[
+                    indexes
+                ].tolist()
+                payload = self._read_payload(
+                    self._read_chunk(chunk_start_offset), record_offset
+                )
+                (data,) = self._decode([payload])
 
-                return torch.from_numpy(array)
+                return torch.from_numpy(self._decoder(data))
 
             case _:
                 raise ValueError
 
+    @staticmethod
+    def _read_payload(chunk: bytes, record_offset: int) -> bytes:
+        (length,) = struct.unpack_from("<Q", chunk, record_offset + 1)
+        start = record_offset + _RECORD_HEADER_LENGTH
+
+        return chunk[start + _MESSAGE_HEADER_LENGTH : start + length]
+
+    def _decode(self, payloads: Sequence[bytes]) -> Sequence[bytes]:
+        # the `data` field of each decoded message
+        match self._batch_message_decoder:
+            case _ if not payloads:
+                return []
+
+            case None:
+                return [self._message_decoder(payload).data for payload in payloads]
+
+            case batch_decoder:
+                return batch_decoder(payloads).get_column("data").to_list()
+
+    @cachedmethod(cache=lambda self: self._chunk_cache, info=True)
+    def _read_chunk(self, chunk_start_offset: int) -> bytes:
+        _ = self._file.seek(chunk_start_offset + 1 + 8)
+        chunk = Chunk.read(ReadDataStream(self._file))  # ty: ignore[invalid-argument-type]
+        stream, length = get_chunk_data_stream(chunk, validate_crc=self._validate_crcs)
+
+        return stream.read(length)
+
+    @property
+    def chunk_cache_info(self) -> ChunkCacheInfo:
+        hits, misses, _, _ = self._read_chunk.cache_info()
+
+        return ChunkCacheInfo(
+            hits=hits,
+            misses=misses,
+            maxsize=int(self._chunk_cache.maxsize),
+            currsize=int(self._chunk_cache.currsize),
+        )
+
     @override
     def __len__(self) -> int:
         return len(self._message_indexes)
 
-    @cached_property
-    def _message_indexes(self) -> Sequence[MessageIndex]:
-        return tuple(
-            self._build_message_indexes(
-                self._file,  # ty: ignore[invalid-argument-type]
-                chunk_indexes=self._chunk_indexes,
-                channel_id=self._channel.id,
-                validate_crc=self._validate_crcs,
-            )
+    @property
+    @override
+    def resources(self) -> SourceResources:
+        return SourceResources(
+            nbytes=self._path.stat().st_size + int(self._chunk_cache.currsize),
+            handles=1,
         )
 
+    @override
+    def close(self) -> None:
+        if self._mmap is not None:
+            self._mmap.close()
+
+        self._chunk_cache.clear()
+
+    @cached_property
+    def _message_indexes(self) -> npt.NDArray[np.int64]:
+        # memory mapped from the sidecar if possible, sharing it between processes
+        if (indexes := self._load_message_indexes()) is None:
+            indexes = np.fromiter(
+                chain.from_iterable(
+                    self._build_message_indexes(
+                        self._file,  # ty: ignore[invalid-argument-type]
+                        chunk_indexes=self._chunk_indexes,
+                        channel_id=self._channel.id,
+                        validate_crc=self._validate_crcs,
+                    )
+                ),
+                dtype=np.int64,
+            ).reshape(-1, 2)
+
+            if self._index_dir is not None:
+                self._save_message_indexes(indexes)
+
+        return indexes
+
+    @property
+    def _index_path(self) -> Path:
+        key = xxh3_64_hexdigest(f"{self._path.resolve()}:{self._channel.topic}")
+
+        return self._index_dir / f"{self._path.name}.{key}.idx.npy"  # ty: ignore[unsupported-operator]
+
+    @property
+    def _index_key(self) -> list[int]:
+        # invalidates the sidecar once the file changes
+        stat = self._path.stat()
+
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def _load_message_indexes(self) -> npt.NDArray[np.int64] | None:
+        if self._index_dir is None:
+            return None
+
+        # the first row holds the key
+        try:
+            sidecar = np.load(self._index_path, mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+
+        match sidecar:
+            case np.ndarray(ndim=2, dtype=np.int64) if (
+                len(sidecar) > 0 and sidecar[0].tolist() == self._index_key
+            ):
+                return sidecar[1:]
+
+            case _:
+                return None
+
+    def _save_message_indexes(self, indexes: npt.NDArray[np.int64]) -> None:
+        path = self._index_path
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with temporary_path(path) as path_tmp:
+                with path_tmp.open("wb") as f:
+                    np.save(f, np.vstack((np.array(self._index_key), indexes)))
+
+                path_tmp.replace(path)
+        except OSError:
+            logger.warning("failed to save message index sidecar", path=path)
+
     @staticmethod
     def _build_message_indexes(
         f: IO[bytes],
@@ -166,23 +315,30 @@ class McapTensorSource(TensorSource[int]):
         chunk_indexes: Iterable[ChunkIndex],
         channel_id: int,
         validate_crc: bool,
-    ) -> Iterable[MessageIndex]:
+    ) -> Iterable[tuple[int, int]]:
         for chunk_index in chunk_indexes:
-            f.seek(chunk_index.chunk_start_offset + 1 + 8)
-            chunk = Chunk.read(ReadDataStream(f))
-            stream, stream_length = get_chunk_data_stream(chunk, validate_crc)
-
-            while stream.count < stream_length:
-                opcode = stream.read1()
-                length = stream.read8()
-                match opcode:
-                    case Opcode.MESSAGE:
-                        if Message.read(stream, length).channel_id == channel_id:
-                            yield MessageIndex(
-                                chunk_start_offset=chunk_index.chunk_start_offset,
-                                message_start_offset=stream.count - length,
-                                message_length=length,
-                            )
-
-                    case _:
-                        stream.read(length)
+            match chunk_index.message_index_offsets.get(channel_id):
+                case int(message_index_offset):
+                    # the file's own index: no need to decompress the chunk
+                    f.seek(message_index_offset + 1 + 8)
+                    records = McapMessageIndex.read(ReadDataStream(f)).records
+                    for _, record_offset in sorted(records, key=itemgetter(1)):
+                        yield chunk_index.chunk_start_offset, record_offset
+
+                case None:
+                    f.seek(chunk_index.chunk_start_offset + 1 + 8)
+                    chunk = Chunk.read(ReadDataStream(f))
+                    stream, stream_length = get_chunk_data_stream(chunk, validate_crc)
+
+                    while stream.count < stream_length:
+                        record_offset = stream.count
+                        opcode = stream.read1()
+                        length = stream.read8()
+                        match opcode:
+                            case Opcode.MESSAGE:
+                                message = Message.read(stream, length)
+                                if message.channel_id == channel_id:
+                                    yield chunk_index.chunk_start_offset, record_offset
+
+                            case _:
+                                stream.read(length)
@@ -10,11 +10,11 @@ from numpy.lib.recfunctions import structured_to_unstructured
 from pydantic import validate_call
 from torch import Tensor
 
-from rbyte.types import TensorSource
+from rbyte.types import ManagedTensorSource, SourceResources
 
 
 @final
-class NumpyTensorSource(TensorSource[object]):
+class NumpyTensorSource(ManagedTensorSource[object]):
     @validate_call
     def __init__(
         self,
@@ -53,3 +53,12 @@ class NumpyTensorSource(TensorSource[object]):
     @override
     def __len__(self) -> int:
         raise NotImplementedError
+
+    @property
+    @override
+    def resources(self) -> SourceResources:
+        return SourceResources(nbytes=0, handles=0)
+
+    @override
+    def close(self) -> None:
+        pass
@@ -6,14 +6,24 @@ from h5py import Dataset, File
 from pydantic import FilePath, validate_call
 from torch import Tensor
 
-from rbyte.types import TensorSource
+from rbyte.types import ManagedTensorSource, SourceResources
 
 
 @final
-class Hdf5TensorSource(TensorSource[int]):
+class Hdf5TensorSource(ManagedTensorSource[int]):
     @validate_call
     def __init__(self, path: FilePath, key: str) -> None:
-        self._dataset = cast(Dataset, File(path)[key])
+        self._path = path
+        self._key = key
+        self._h5_dataset: Dataset | None = None
+        _ = self._dataset
+
+    @property
+    def _dataset(self) -> Dataset:
+        if self._h5_dataset is None:
+            self._h5_dataset = cast(Dataset, File(self._path)[self._key])
+
+        return self._h5_dataset
 
     @override
     def __getitem__(self, indexes: int | Sequence[int]) -> Tensor:
@@ -22,3 +32,17 @@ class Hdf5TensorSource(TensorSource[int]):
     @override
     def __len__(self) -> int:
         return len(self._dataset)
+
+    @property
+    @override
+    def resources(self) -> SourceResources:
+        # the raw data chunk cache
+        _, _, nbytes, _ = self._dataset.file.id.get_access_plist().get_cache()
+
+        return SourceResources(nbytes=nbytes, handles=1)
+
+    @override
+    def close(self) -> None:
+        if self._h5_dataset is not None:
+            self._h5_dataset.file.close()
+            self._h5_dataset = None
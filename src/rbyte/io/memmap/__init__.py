@@ -0,0 +1,3 @@
+from .tensor_source import MemmapTensorSource
+
+__all__ = ["MemmapTensorSource"]
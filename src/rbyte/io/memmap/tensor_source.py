@@ -0,0 +1,77 @@
+from collections.abc import Sequence
+from typing import final, override
+
+import numpy as np
+import numpy.typing as npt
+import torch
+from pydantic import DirectoryPath, validate_call
+from structlog import get_logger
+from torch import Tensor
+
+from rbyte.types import ManagedTensorSource, SourceResources
+
+logger = get_logger(__name__)
+
+
+@final
+class MemmapTensorSource(ManagedTensorSource[int]):
+    """Tensors written by `Dataset.export_streams`, read from a memory-mapped file.
+
+    `indexes.npy` holds the (sorted, unique) source indexes and `tensors.npy` the
+    tensor of each, in the same order.
+    """
+
+    TENSORS = "tensors.npy"
+    INDEXES = "indexes.npy"
+
+    @validate_call
+    def __init__(self, path: DirectoryPath) -> None:
+        super().__init__()
+
+        self._path = path
+        self._indexes: npt.NDArray[np.int64] = np.load(path / self.INDEXES)
+        self._memmap = None
+
+    @property
+    def _tensors(self) -> np.memmap:
+        if self._memmap is None:
+            self._memmap = np.load(self._path / self.TENSORS, mmap_mode="r")
+
+        return self._memmap
+
+    def _rows(self, indexes: npt.ArrayLike) -> npt.NDArray[np.intp]:
+        rows = np.searchsorted(self._indexes, indexes).clip(max=len(self) - 1)
+        if not np.array_equal(self._indexes[rows], indexes):
+            logger.error(msg := "indexes not exported", path=self._path.as_posix())
+
+            raise IndexError(msg)
+
+        return rows
+
+    @override
+    def __getitem__(self, indexes: int | Sequence[int]) -> Tensor:
+        match indexes:
+            case Sequence():
+                # fancy indexing copies out of the page cache
+                return torch.from_numpy(self._tensors[self._rows(indexes)])
+
+            case int():
+                return torch.from_numpy(np.array(self._tensors[self._rows(indexes)]))
+
+            case _:
+                raise ValueError
+
+    @override
+    def __len__(self) -> int:
+        return len(self._indexes)
+
+    @property
+    @override
+    def resources(self) -> SourceResources:
+        return SourceResources(
+            nbytes=(self._path / self.TENSORS).stat().st_size, handles=1
+        )
+
+    @override
+    def close(self) -> None:
+        self._memmap = None
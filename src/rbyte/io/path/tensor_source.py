@@ -9,11 +9,11 @@ import torch
 from pydantic import validate_call
 from torch import Tensor
 
-from rbyte.types import TensorSource
+from rbyte.types import ManagedTensorSource, SourceResources
 
 
 @final
-class PathTensorSource(TensorSource[object]):
+class PathTensorSource(ManagedTensorSource[object]):
     @validate_call
     def __init__(
         self,
@@ -56,3 +56,12 @@ class PathTensorSource(TensorSource[object]):
     @override
     def __len__(self) -> int:
         raise NotImplementedError
+
+    @property
+    @override
+    def resources(self) -> SourceResources:
+        return SourceResources(nbytes=0, handles=0)
+
+    @override
+    def close(self) -> None:
+        pass
@@ -10,7 +10,7 @@ from torch.nn import Module
 from torchcodec.decoders import VideoDecoder, set_cuda_backend
 from torchcodec.transforms import DecoderTransform
 
-from rbyte.types import TensorSource
+from rbyte.types import ManagedTensorSource, SourceResources
 
 
 @unique
@@ -32,7 +32,7 @@ class CudaBackend(StrEnum):
 
 
 @final
-class TorchCodecFrameSource(TensorSource[int]):
+class TorchCodecFrameSource(ManagedTensorSource[int]):
     @validate_call
     def __init__(  # noqa: PLR0913
         self,
@@ -60,24 +60,42 @@ class TorchCodecFrameSource(TensorSource[int]):
                 case _:
                     cuda_backend = CudaBackend.FFMPEG
 
-        with (
-            set_cuda_backend(cuda_backend),
-            (
-                nullcontext()
-                if custom_frame_mappings is None
-                else custom_frame_mappings.open()
-            ) as f_custom_frame_mappings,
-        ):
-            self._decoder = VideoDecoder(
-                source=source,
-                stream_index=stream_index,
-                dimension_order=dimension_order.value,
-                num_ffmpeg_threads=num_ffmpeg_threads,
-                device=device,
-                seek_mode=seek_mode.value,
-                transforms=transforms,
-                custom_frame_mappings=f_custom_frame_mappings,  # ty:ignore[invalid-argument-type]
-            )
+        self._source = source
+        self._stream_index = stream_index
+        self._dimension_order = dimension_order
+        self._num_ffmpeg_threads = num_ffmpeg_threads
+        self._device = device
+        self._seek_mode = seek_mode
+        self._transforms = transforms
+        self._custom_frame_mappings = custom_frame_mappings
+        self._cuda_backend = cuda_backend
+
+        self._video_decoder: VideoDecoder | None = None
+        _ = self._decoder
+
+    @property
+    def _decoder(self) -> VideoDecoder:
+        if self._video_decoder is None:
+            with (
+                set_cuda_backend(self._cuda_backend),
+                (
+                    nullcontext()
+                    if self._custom_frame_mappings is None
+                    else self._custom_frame_mappings.open()
+                ) as f_custom_frame_mappings,
+            ):
+                self._video_decoder = VideoDecoder(
+                    source=self._source,
+                    stream_index=self._stream_index,
+                    dimension_order=self._dimension_order.value,
+                    num_ffmpeg_threads=self._num_ffmpeg_threads,
+                    device=self._device,
+                    seek_mode=self._seek_mode.value,
+                    transforms=self._transforms,
+                    custom_frame_mappings=f_custom_frame_mappings,  # ty:ignore[invalid-argument-type]
+                )
+
+        return self._video_decoder
 
     @override
     def __getitem__(self, indexes: int | Sequence[int]) -> Tensor:
@@ -94,3 +112,17 @@ class TorchCodecFrameSource(TensorSource[int]):
     @override
     def __len__(self) -> int:
         return self._decoder.metadata.num_frames or 0
+
+    @property
+    @override
+    def resources(self) -> SourceResources:
+        # rough estimate: a decoded RGB frame per decoding thread plus the output
+        metadata = self._decoder.metadata
+        frame_nbytes = (metadata.width or 0) * (metadata.height or 0) * 3
+        nbytes = frame_nbytes * (max(self._num_ffmpeg_threads, 1) + 1)
+
+        return SourceResources(nbytes=nbytes, handles=1)
+
+    @override
+    def close(self) -> None:
+        self._video_decoder = None
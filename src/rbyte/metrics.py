@@ -0,0 +1,171 @@
+import os
+from bisect import bisect_left
+from collections import defaultdict
+from collections.abc import Generator
+from contextlib import contextmanager
+from enum import StrEnum, auto, unique
+from threading import Lock
+from time import perf_counter
+from typing import NamedTuple
+
+from rbyte.cache import SourceCacheInfo, TensorCacheInfo
+
+__all__ = [
+    "DatasetMetrics",
+    "HistogramSnapshot",
+    "MetricsKey",
+    "MetricsSnapshot",
+    "Stage",
+    "WorkerMetrics",
+]
+
+# upper bucket bounds (seconds), doubling from 1us to ~18min, plus an overflow bucket
+BOUNDS: tuple[float, ...] = tuple(2**i * 1e-6 for i in range(31))
+
+
+@unique
+class Stage(StrEnum):
+    gather = auto()  # data and `input_id` code gathering
+    meta = auto()  # batch meta assembly
+    source = auto()  # source instantiation (source cache misses)
+    read = auto()  # source reads, including decoding and tensor cache lookups
+    stream = auto()  # a whole stream: reads plus batch assembly
+
+
+class MetricsKey(NamedTuple):
+    stage: Stage
+    stream_id: str | None = None
+    input_id: str | None = None
+
+
+class HistogramSnapshot(NamedTuple):
+    count: int
+    total: float
+    buckets: tuple[int, ...]
+
+    def quantile(self, q: float) -> float:
+        # upper bound of the bucket containing the `q`-quantile
+        rank, seen = q * self.count, 0
+        for bound, count in zip((*BOUNDS, float("inf")), self.buckets, strict=True):
+            seen += count
+            if seen >= rank:
+                return bound
+
+        return float("inf")
+
+    def merge(self, other: "HistogramSnapshot") -> "HistogramSnapshot":
+        return HistogramSnapshot(
+            count=self.count + other.count,
+            total=self.total + other.total,
+            buckets=tuple(map(sum, zip(self.buckets, other.buckets, strict=True))),
+        )
+
+
+class MetricsSnapshot(NamedTuple):
+    pid: int
+    latencies: dict[MetricsKey, HistogramSnapshot]
+    nbytes: dict[str, int]
+    source_cache: SourceCacheInfo | None
+    tensor_cache: TensorCacheInfo | None
+
+    def merge(self, other: "MetricsSnapshot") -> "MetricsSnapshot":
+        # `other` being a later (reset) snapshot: histograms and bytes add up, while
+        # cache counters are cumulative already
+        latencies = dict(self.latencies)
+        for key, histogram in other.latencies.items():
+            latencies[key] = (
+                latencies[key].merge(histogram) if key in latencies else histogram
+            )
+
+        nbytes = dict(self.nbytes)
+        for stream_id, value in other.nbytes.items():
+            nbytes[stream_id] = nbytes.get(stream_id, 0) + value
+
+        return MetricsSnapshot(
+            pid=other.pid,
+            latencies=latencies,
+            nbytes=nbytes,
+            source_cache=other.source_cache,
+            tensor_cache=other.tensor_cache,
+        )
+
+
+class DatasetMetrics:
+    """Per-process latency histograms and produced bytes of `Dataset.get_batch`."""
+
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self._buckets: defaultdict[MetricsKey, list[int]] = defaultdict(
+            lambda: [0] * (len(BOUNDS) + 1)
+        )
+        self._totals: defaultdict[MetricsKey, float] = defaultdict(float)
+        self._nbytes: defaultdict[str, int] = defaultdict(int)
+
+    @contextmanager
+    def time(self, key: MetricsKey) -> Generator[None]:
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = perf_counter() - start
+            with self._lock:
+                self._buckets[key][bisect_left(BOUNDS, elapsed)] += 1
+                self._totals[key] += elapsed
+
+    def add_nbytes(self, stream_id: str, nbytes: int) -> None:
+        with self._lock:
+            self._nbytes[stream_id] += nbytes
+
+    def snapshot(
+        self,
+        *,
+        source_cache: SourceCacheInfo | None,
+        tensor_cache: TensorCacheInfo | None,
+        reset: bool = False,
+    ) -> MetricsSnapshot:
+        with self._lock:
+            snapshot = MetricsSnapshot(
+                pid=os.getpid(),
+                latencies={
+                    key: HistogramSnapshot(
+                        count=sum(buckets),
+                        total=self._totals[key],
+                        buckets=tuple(buckets),
+                    )
+                    for key, buckets in self._buckets.items()
+                },
+                nbytes=dict(self._nbytes),
+                source_cache=source_cache,
+                tensor_cache=tensor_cache,
+            )
+
+            if reset:
+                self._buckets.clear()
+                self._totals.clear()
+                self._nbytes.clear()
+
+        return snapshot
+
+
+class WorkerMetrics:
+    """`MetricsSnapshot`s per process, accumulated from the ones workers reset."""
+
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self._snapshots: dict[int, MetricsSnapshot] = {}
+
+    def add(self, snapshot: MetricsSnapshot) -> None:
+        with self._lock:
+            self._snapshots[snapshot.pid] = (
+                previous.merge(snapshot)
+                if (previous := self._snapshots.get(snapshot.pid)) is not None
+                else snapshot
+            )
+
+    def snapshot(self, *, reset: bool = False) -> dict[int, MetricsSnapshot]:
+        with self._lock:
+            snapshots = dict(self._snapshots)
+            if reset:
+                self._snapshots.clear()
+
+        return snapshots
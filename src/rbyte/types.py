@@ -1,5 +1,5 @@
 from collections.abc import Sequence
-from typing import Protocol, runtime_checkable
+from typing import NamedTuple, Protocol, runtime_checkable
 
 from tensordict import NonTensorStack, TensorClass, TensorDict
 from torch import Tensor
@@ -9,12 +9,34 @@ class BatchMeta(TensorClass, autocast=True):
     input_id: NonTensorStack
 
 
+class EncodedBatchMeta(TensorClass, autocast=True):
+    """`BatchMeta` with `input_id`s as codes into `Dataset.input_ids`."""
+
+    input_id: Tensor
+
+
 class Batch(TensorClass, autocast=True):
     data: TensorDict
-    meta: BatchMeta | None = None
+    meta: BatchMeta | EncodedBatchMeta | None = None
 
 
 @runtime_checkable
 class TensorSource[I](Protocol):
     def __getitem__(self, indexes: I | Sequence[I]) -> Tensor: ...
     def __len__(self) -> int: ...
+
+
+class SourceResources(NamedTuple):
+    """Upper bounds on what an open source holds, e.g. a whole mapped file."""
+
+    nbytes: int
+    handles: int
+
+
+@runtime_checkable
+class ManagedTensorSource[I](TensorSource[I], Protocol):
+    """A `TensorSource` releasing its resources on `close`, re-acquired lazily."""
+
+    @property
+    def resources(self) -> SourceResources: ...
+    def close(self) -> None: ...
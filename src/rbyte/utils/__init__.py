@@ -1,3 +1,4 @@
 from ._datetime import datetime_from_nanos
+from ._path import temporary_path
 
-__all__ = ["datetime_from_nanos"]
+__all__ = ["datetime_from_nanos", "temporary_path"]
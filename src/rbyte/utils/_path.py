@@ -0,0 +1,20 @@
+import os
+import threading
+from collections.abc import Generator
+from contextlib import contextmanager
+from pathlib import Path
+
+
+@contextmanager
+def temporary_path(path: Path) -> Generator[Path]:
+    """A temporary sibling of `path`, private to this process and thread.
+
+    Yields:
+        A path to write and `replace` onto `path`, which updates `path` atomically.
+        It is removed on exit if it was not moved.
+    """
+    path_tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        yield path_tmp
+    finally:
+        path_tmp.unlink(missing_ok=True)
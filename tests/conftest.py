@@ -1,5 +1,6 @@
 import multiprocessing
 from collections import OrderedDict
+from collections.abc import Callable, Sequence
 from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
@@ -39,15 +40,21 @@ CONFIG_PATH = "../config"
 DATA_DIR = Path(__file__).resolve().parent / "data"
 
 
-def _build_dataset(name: str) -> Dataset:
+def _build_dataset(name: str, overrides: Sequence[str] = ()) -> Dataset:
     with initialize(version_base=None, config_path=CONFIG_PATH):
         cfg = compose(
-            "dataset", overrides=[f"dataset={name}", f"+data_dir={DATA_DIR}/{name}"]
+            "dataset",
+            overrides=[f"dataset={name}", f"+data_dir={DATA_DIR}/{name}", *overrides],
         )
 
     return instantiate(cfg.dataset)
 
 
+@pytest.fixture(scope="session")
+def build_dataset() -> Callable[[str, Sequence[str]], Dataset]:
+    return _build_dataset
+
+
 # TODO: cleaner way of doing this while preserving fixture caching?  # noqa: FIX002
 @pytest.fixture(scope="session")
 def carla_garage_dataset() -> Dataset:
@@ -1,24 +1,350 @@
+import operator
+import os
+import threading
+import time
+from typing import Literal
+
 import pytest
+import torch
+import torchdata.nodes as tn
+from pydantic import ByteSize
 from pytest_lazy_fixtures import lf
 from torch.utils.data import DataLoader
 
 from rbyte import Dataset
-from rbyte.dataloader import TorchDataNodeDataLoader, collate_identity
+from rbyte.dataloader import (
+    BlockShuffleSampler,
+    BytePrefetcher,
+    InputIdRouter,
+    RoutedParallelMapper,
+    ShardedSampler,
+    SharedMemoryRing,
+    TorchDataNodeDataLoader,
+    _RingHandle,  # noqa: PLC2701
+    _shutdown_nodes,  # noqa: PLC2701
+    collate_identity,
+)
+from rbyte.metrics import MetricsKey, Stage
 
 
 @pytest.mark.parametrize("dataset", [lf("yaak_dataset")])
-def test_dataloaders(dataset: Dataset) -> None:
+@pytest.mark.parametrize("shuffle", [False, True])
+def test_dataloaders(dataset: Dataset, *, shuffle: bool) -> None:
     kwargs = {
         "dataset": dataset,
         "batch_size": 2,
-        "shuffle": False,
+        "shuffle": shuffle,
         "collate_fn": collate_identity,
         "num_workers": 1,
         "multiprocessing_context": "forkserver",
     }
 
-    torch_dataloader = DataLoader(**kwargs)  # ty: ignore[invalid-argument-type]
-    torchdata_dataloader = TorchDataNodeDataLoader(method="process", **kwargs)  # ty: ignore[invalid-argument-type]
+    # by default, the same samplers (and hence order) as `DataLoader`, which draws
+    # its workers' base seed from the generator first
+    torch_dataloader = DataLoader(generator=torch.Generator().manual_seed(0), **kwargs)  # ty: ignore[invalid-argument-type]
+    generator = torch.Generator().manual_seed(0)
+    torch.empty((), dtype=torch.int64).random_(generator=generator)
+    torchdata_dataloader = TorchDataNodeDataLoader(
+        method="process",
+        generator=generator,
+        **kwargs,  # ty: ignore[invalid-argument-type]
+    )
 
     for left, right in zip(torch_dataloader, torchdata_dataloader, strict=True):
         assert (left == right).all()
+
+
+def test_block_shuffle_sampler() -> None:
+    groups = torch.tensor([0] * 5 + [1] * 7)
+    blocks = [range(3), range(3, 5), range(5, 8), range(8, 11), range(11, 12)]
+
+    def sample(buffer_size: int) -> list[int]:
+        sampler = BlockShuffleSampler(
+            range(len(groups)),
+            block_size=3,
+            buffer_size=buffer_size,
+            groups=groups,
+            seed=0,
+        )
+        return list(sampler)
+
+    indexes = sample(buffer_size=1)
+    assert sorted(indexes) == list(range(len(groups)))
+    assert indexes == sample(buffer_size=1)
+
+    # a buffer of at most one block keeps blocks contiguous
+    for block in blocks:
+        positions = sorted(indexes.index(i) for i in block)
+        assert positions == list(range(positions[0], positions[0] + len(block)))
+
+    assert sorted(sample(buffer_size=4)) == list(range(len(groups)))
+
+
+@pytest.mark.parametrize("block_size", [None, 3])
+def test_sharded_sampler(block_size: int | None) -> None:
+    length, world_size = 12, 3
+
+    def make(rank: int) -> ShardedSampler | BlockShuffleSampler:
+        return (
+            ShardedSampler(range(length), seed=0, rank=rank, world_size=world_size)
+            if block_size is None
+            else BlockShuffleSampler(
+                range(length),
+                block_size=block_size,
+                buffer_size=4,
+                seed=0,
+                rank=rank,
+                world_size=world_size,
+            )
+        )
+
+    shards = [list(make(rank)) for rank in range(world_size)]
+    assert sorted(index for shard in shards for index in shard) == list(range(length))
+
+    sampler = make(rank=1)
+    it = iter(sampler)
+    head = [next(it) for _ in range(2)]
+    state = sampler.state_dict()
+
+    resumed = make(rank=1)
+    resumed.load_state_dict(state)
+    assert head + list(resumed) == shards[1]
+
+
+@pytest.mark.parametrize("dataset", [lf("yaak_dataset")])
+@pytest.mark.parametrize("resumable", [False, True])
+def test_dataloader_state_dict(dataset: Dataset, *, resumable: bool) -> None:
+    kwargs = {
+        "dataset": dataset,
+        "batch_size": 1,
+        "shuffle": True,
+        "resumable": resumable,
+        "seed": 0,
+        "collate_fn": collate_identity,
+    }
+
+    dataloader = TorchDataNodeDataLoader(**kwargs)  # ty: ignore[invalid-argument-type]
+    it = iter(dataloader)
+    next(it)
+    state = dataloader.state_dict()
+    expected = list(it)
+
+    resumed = TorchDataNodeDataLoader(**kwargs)  # ty: ignore[invalid-argument-type]
+    resumed.load_state_dict(state)
+    for left, right in zip(expected, resumed, strict=True):
+        assert (left == right).all()
+
+
+@pytest.mark.parametrize("dataset", [lf("nuscenes_dataset"), lf("yaak_dataset")])
+@pytest.mark.parametrize("method", ["thread", "process"])
+def test_route_by_input_id(dataset: Dataset, method: str) -> None:
+    kwargs = {
+        "dataset": dataset,
+        "batch_size": 2,
+        "shuffle": False,
+        "collate_fn": collate_identity,
+        "num_workers": 2,
+        "method": method,
+        "multiprocessing_context": "forkserver",
+    }
+
+    dataloader = TorchDataNodeDataLoader(**kwargs)  # ty: ignore[invalid-argument-type]
+    dataloader_routed = TorchDataNodeDataLoader(route_by_input_id=True, **kwargs)  # ty: ignore[invalid-argument-type]
+
+    for left, right in zip(dataloader, dataloader_routed, strict=True):
+        assert (left == right).all()
+
+
+@pytest.mark.parametrize("method", ["thread", "process"])
+@pytest.mark.parametrize("prebatch", [None, 3])
+def test_routed_parallel_mapper(
+    method: Literal["thread", "process"], prebatch: int | None
+) -> None:
+    length = 20
+
+    def make() -> RoutedParallelMapper[int, int]:
+        return RoutedParallelMapper(
+            tn.IterableWrapper(range(length)),
+            operator.neg,
+            route=abs,
+            num_workers=2,
+            method=method,
+            multiprocessing_context="forkserver",
+            snapshot_frequency=4,
+            prebatch=prebatch,
+        )
+
+    mapper = make()
+    mapper.reset()
+    head = [next(mapper) for _ in range(7)]
+    state = mapper.state_dict()
+    tail = list(mapper)
+    assert head + tail == [-i for i in range(length)]
+
+    # resumed from the last snapshot, and reset (stopping workers) mid-way
+    resumed = make()
+    resumed.reset(state)
+    assert next(resumed) == tail[0]
+    resumed.reset(state)
+    assert list(resumed) == tail
+
+
+@pytest.mark.parametrize("prebatch", [None, 3])
+def test_shutdown_nodes(monkeypatch: pytest.MonkeyPatch, prebatch: int | None) -> None:
+    threads = set(threading.enumerate())
+
+    def make() -> tn.BaseNode[int]:
+        node = tn.ParallelMapper(
+            tn.IterableWrapper(range(100)),
+            operator.neg,
+            num_workers=2,
+            method="thread",
+            prebatch=prebatch,
+        )
+        node = tn.Prefetcher(node, prefetch_factor=2)
+        node.reset()
+        assert next(node) == 0
+        return node
+
+    # left to garbage collection by torchdata versions it wasn't checked against
+    with monkeypatch.context() as m:
+        m.setattr("rbyte.dataloader._TORCHDATA_SHUTDOWN_VERSIONS", frozenset())
+        node = make()
+        _shutdown_nodes(node)
+        assert set(threading.enumerate()) > threads
+
+    _shutdown_nodes(node)
+    assert set(threading.enumerate()) <= threads
+
+    node = make()
+    _shutdown_nodes(node)
+    assert set(threading.enumerate()) <= threads
+
+
+@pytest.mark.parametrize("dataset", [lf("yaak_dataset")])
+def test_shared_memory_ring_dataloader(dataset: Dataset) -> None:
+    kwargs = {
+        "dataset": dataset,
+        "batch_size": 2,
+        "shuffle": False,
+        "collate_fn": collate_identity,
+        "num_workers": 2,
+        "method": "process",
+        "multiprocessing_context": "forkserver",
+    }
+
+    dataloader = TorchDataNodeDataLoader(**kwargs)  # ty: ignore[invalid-argument-type]
+    # sized to the batches (plus alignment), with the default number of slots
+    dataloader_ring = TorchDataNodeDataLoader(
+        shared_memory_slot_size=2 * dataset.get_batch([0, 1]).data.bytes(),
+        **kwargs,  # ty: ignore[invalid-argument-type]
+    )
+
+    for left, right in zip(dataloader, dataloader_ring, strict=True):
+        assert (left == right).all()
+
+
+@pytest.mark.parametrize("dataset", [lf("yaak_dataset")])
+def test_worker_metrics(dataset: Dataset) -> None:
+    dataset = Dataset(
+        data=dataset.data, meta=dataset.meta, streams=dataset.streams, metrics=True
+    )
+    dataloader = TorchDataNodeDataLoader(
+        dataset=dataset,
+        batch_size=1,
+        collate_fn=collate_identity,
+        num_workers=2,
+        method="process",
+        multiprocessing_context="forkserver",
+        collect_metrics=True,
+    )
+
+    num_batches = sum(1 for _ in dataloader)
+    metrics = dataloader.worker_metrics(reset=True)
+
+    assert metrics is not None
+    assert os.getpid() not in metrics
+    assert (
+        sum(
+            snapshot.latencies[MetricsKey(Stage.gather)].count
+            for snapshot in metrics.values()
+        )
+        == num_batches
+    )
+    assert not dataloader.worker_metrics()
+
+
+@pytest.mark.parametrize("dataset", [lf("yaak_dataset")])
+def test_autotune(dataset: Dataset) -> None:
+    kwargs = {
+        "dataset": dataset,
+        "batch_size": 1,
+        "shuffle": False,
+        "collate_fn": collate_identity,
+    }
+
+    dataloader = TorchDataNodeDataLoader(**kwargs)  # ty: ignore[invalid-argument-type]
+    dataloader_autotuned = TorchDataNodeDataLoader(
+        autotune=True,
+        autotune_batches=1,
+        max_concurrent=1,
+        **kwargs,  # ty: ignore[invalid-argument-type]
+    )
+
+    for _ in range(2):
+        for left, right in zip(dataloader, dataloader_autotuned, strict=True):
+            assert (left == right).all()
+
+    assert dataloader_autotuned.concurrency.max_concurrent == 1
+
+
+def test_byte_prefetcher() -> None:
+    max_bytes = 16
+    batches = [torch.zeros(n, dtype=torch.uint8) for n in (8, 16, 4, 32, 2)]
+    node = BytePrefetcher(tn.IterableWrapper(batches), max_bytes=max_bytes)
+
+    for expected, batch in zip(batches, tn.Loader(node), strict=True):
+        assert batch is expected
+        # the budget is exceeded by at most one batch
+        assert node.nbytes < max_bytes + max(b.nbytes for b in batches)
+
+    # a shared memory ring handle takes up its whole slot
+    slot_size = ByteSize(1024)
+    ring = SharedMemoryRing(num_slots=2, slot_size=slot_size)
+    handles = [ring.write(torch.zeros(1)) for _ in range(2)]
+    node = BytePrefetcher(tn.IterableWrapper(handles), max_bytes=slot_size)
+    node.reset()
+
+    deadline = time.monotonic() + 10
+    while node.nbytes < slot_size and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert node.nbytes == slot_size
+
+
+def test_shared_memory_ring() -> None:
+    ring = SharedMemoryRing(num_slots=1, slot_size=ByteSize(1024))
+    batch = {"x": torch.arange(4), "y": torch.ones(2, 3), "z": "z"}
+
+    handle = ring.write(batch)
+    assert isinstance(handle, _RingHandle)
+    assert ring.write(batch) is batch  # no free slot
+
+    read = ring.read(handle)
+    assert isinstance(read, dict)
+    assert read.keys() == batch.keys()
+    assert all((read[k] == batch[k]).all() for k in ("x", "y"))
+
+    ring.release(handle.slot)
+    large = {"x": torch.empty(2048, dtype=torch.uint8)}
+    assert ring.write(large) is large  # exceeds the slot
+    assert ring.write(batch) is not batch
+
+
+def test_input_id_router() -> None:
+    num_workers = 3
+    router = InputIdRouter(torch.tensor([0, 0, 1, 1, 1, 2]), num_workers=num_workers)
+
+    assert router([0, 1, 2]) == router([0, 1])
+    assert router([2, 3, 0]) == router([4])
+    assert all(0 <= router([i]) < num_workers for i in range(6))
@@ -1,17 +1,26 @@
-from collections.abc import Iterable
+import asyncio
+import inspect
+from collections import defaultdict
+from collections.abc import Callable, Iterable, Sequence
 from pathlib import Path
 from types import SimpleNamespace
-from typing import cast
+from typing import Any, cast
 
 import dill  # noqa: S403
 import more_itertools as mit
+import polars as pl
 import pytest
 import torch
 from pytest_lazy_fixtures import lf
 from structlog import get_logger
+from tensordict import TensorDict
 from torch import Tensor
 
-from rbyte import Dataset
+from rbyte import Dataset, DatasetWriter
+from rbyte.cache import TensorCacheInfo
+from rbyte.config import SourceCacheConfig, SourceCacheWeight, TensorCacheConfig
+from rbyte.metrics import MetricsKey, Stage
+from rbyte.types import Batch, EncodedBatchMeta
 
 logger = get_logger(__name__)
 
@@ -254,6 +263,111 @@ def test_save_and_load(dataset: Dataset, tmp_path: Path) -> None:
     assert dataset == Dataset.load(tmp_path)
 
 
+@pytest.mark.parametrize(
+    "dataset", [lf("mimicgen_dataset"), lf("yaak_dataset"), lf("zod_dataset")]
+)
+def test_save_and_load_sharded(dataset: Dataset, tmp_path: Path) -> None:
+    dataset.save(tmp_path, row_group_size=2)
+    dataset_loaded = Dataset.load(tmp_path)
+
+    assert dataset == dataset_loaded
+    assert dataset_loaded.meta.schema == dataset.meta.schema
+    assert dataset_loaded.input_ids == dataset.input_ids
+    assert torch.equal(dataset_loaded.input_id_codes, dataset.input_id_codes)
+    assert len(list((tmp_path / "meta").iterdir())) == -(-len(dataset) // 2)
+
+    # meta is only read when first needed, batches decode `input_id` codes
+    for path in (tmp_path / "meta").iterdir():
+        path.unlink()
+
+    dataset_loaded = Dataset.load(tmp_path)
+    index = range(len(dataset))
+    batch = dataset_loaded.get_batch(index, include_streams=False)
+    expected = dataset.get_batch(index, include_streams=False)
+    assert batch.meta is not None
+    assert expected.meta is not None
+    assert batch.meta.to_dict() == expected.meta.to_dict()
+
+
+@pytest.mark.parametrize(
+    ("name", "dataset"),
+    [("mimicgen", lf("mimicgen_dataset")), ("zod", lf("zod_dataset"))],
+)
+def test_create(
+    name: str,
+    dataset: Dataset,
+    tmp_path: Path,
+    build_dataset: Callable[[str, Sequence[str]], Dataset],
+) -> None:
+    build_dataset(
+        name,
+        [
+            "dataset._target_=rbyte.Dataset.create",
+            f"+dataset.path={tmp_path}",
+            "+dataset.row_group_size=2",
+        ],
+    )
+    assert dataset == Dataset.load(tmp_path)
+
+    empty = Dataset(
+        data=cast(TensorDict, dataset.data[:0]), meta=dataset.meta[:0], streams=None
+    )
+    (tmp_path / "empty").mkdir()
+    empty.save(tmp_path / "empty", row_group_size=2)
+    assert not len(Dataset.load(tmp_path / "empty"))
+
+
+@pytest.mark.parametrize("dataset", [lf("mimicgen_dataset"), lf("zod_dataset")])
+def test_append(dataset: Dataset, tmp_path: Path) -> None:
+    dataset = Dataset(data=dataset.data, meta=dataset.meta, streams=None)
+    dataset.save(tmp_path, row_group_size=2)
+    meta = dataset.meta.with_columns(pl.col("input_id").cast(pl.String) + "_new")
+
+    with DatasetWriter.reopen(tmp_path, streams=None) as writer:
+        writer.write(dataset.data, meta)
+
+    dataset_appended = Dataset.load(tmp_path)
+    assert len(dataset_appended) == 2 * len(dataset)
+    assert (
+        cast(TensorDict, dataset_appended.data[: len(dataset)]) == dataset.data
+    ).all()
+    assert (
+        cast(TensorDict, dataset_appended.data[len(dataset) :]) == dataset.data
+    ).all()
+
+    with (
+        pytest.raises(ValueError, match="already written"),
+        DatasetWriter.reopen(tmp_path, streams=None) as writer,
+    ):
+        writer.write(dataset.data, meta)
+
+    # a write failing after an earlier flush leaves no orphaned rows behind
+    meta_failed = dataset.meta.with_columns(
+        pl.col("input_id").cast(pl.String) + "_failed"
+    )
+
+    def write_failing() -> None:
+        data = cast(TensorDict, dataset.data[:2])
+        unsqueezed = cast(TensorDict, data.apply(lambda x: x.unsqueeze(-1)))
+        with DatasetWriter.reopen(tmp_path, streams=None) as writer:
+            writer.write(data, meta_failed[:2])
+            writer.write(unsqueezed, meta_failed[:2])
+
+    with pytest.raises(ValueError, match="column schema differs"):
+        write_failing()
+
+    assert Dataset.load(tmp_path) == dataset_appended
+
+    with DatasetWriter.reopen(tmp_path, streams=None) as writer:
+        writer.write(dataset.data, meta_failed)
+
+    dataset_appended = Dataset.load(tmp_path)
+    assert len(dataset_appended) == 3 * len(dataset)
+    assert (
+        cast(TensorDict, dataset_appended.data[2 * len(dataset) :]) == dataset.data
+    ).all()
+
+
 @pytest.mark.parametrize(
     "dataset",
     [
@@ -268,8 +382,287 @@ def test_pickle(dataset: Dataset) -> None:
     assert dill.pickles(dataset, exact=True, safe=True)
 
 
+@pytest.mark.parametrize("dataset", [lf("yaak_dataset"), lf("zod_dataset")])
+def test_pickle_shared_meta(dataset: Dataset) -> None:
+    state = dataset.__getstate__()
+    assert state["meta_ipc"].is_shared()
+    assert dataset.__getstate__()["meta_ipc"] is state["meta_ipc"]
+
+    dataset_unpickled = Dataset.__new__(Dataset)
+    dataset_unpickled.__setstate__(state)
+    assert dataset_unpickled == dataset
+
+
 @pytest.mark.parametrize(
     "datasets", [(lf("yaak_dataset"), lf("yaak_dataset_pydantic"))]
 )
 def test_equal(datasets: Iterable[Dataset]) -> None:
     assert mit.all_equal(datasets)
+
+
+def assert_batch_equal(dataset: Dataset, batch: Batch, expected: Batch) -> None:
+    assert (batch.data == expected.data).all()
+
+    meta = batch.meta
+    if isinstance(meta, EncodedBatchMeta):
+        meta = dataset.decode_meta(meta)
+
+    assert meta is not None
+    assert expected.meta is not None
+    assert meta.to_dict() == expected.meta.to_dict()
+
+
+def assert_tensor_cache_size(
+    dataset: Dataset,
+    tensor_cache: TensorCacheConfig,
+    info: TensorCacheInfo,
+    index: list[int],
+) -> None:
+    # the size is shared through the cache directory, not rescanned
+    dataset_full = Dataset(
+        data=dataset.data,
+        meta=dataset.meta,
+        streams=dataset.streams,
+        tensor_cache=tensor_cache.model_copy(update={"maxsize": 1}),
+    )
+    info_full = dataset_full.tensor_cache_info
+    assert info_full is not None
+    assert info_full.currsize == info.currsize
+    assert (dataset_full.get_batch(index) == dataset.get_batch(index)).all()
+
+    # least recently used entries make room for new ones
+    dataset_evicting = Dataset(
+        data=dataset.data,
+        meta=dataset.meta,
+        streams=dataset.streams,
+        tensor_cache=TensorCacheConfig(
+            path=tensor_cache.path.with_name("evicting"), maxsize=info.currsize // 2
+        ),
+    )
+    for _ in range(2):
+        assert (dataset_evicting.get_batch(index) == dataset.get_batch(index)).all()
+
+    info_evicting = dataset_evicting.tensor_cache_info
+    assert info_evicting is not None
+    assert 0 < info_evicting.currsize <= info_evicting.maxsize
+
+
+def assert_metrics(dataset: Dataset, index: list[int]) -> None:
+    dataset.collect_metrics(reset=True)
+    batch = dataset.get_batch(index)
+    metrics = dataset.collect_metrics(reset=True)
+
+    assert metrics is not None
+    assert metrics.latencies[MetricsKey(Stage.gather)].count == 1
+    for stream_id in dataset.streams or {}:
+        histogram = metrics.latencies[MetricsKey(Stage.stream, stream_id)]
+        assert histogram.count == 1
+        assert 0 < histogram.quantile(0.5) < float("inf")
+        assert metrics.nbytes[stream_id] == batch.get(("data", stream_id)).nbytes
+
+    assert metrics.source_cache is not None
+    metrics = dataset.collect_metrics()
+    assert metrics is not None
+    assert not metrics.latencies
+
+
+@pytest.mark.parametrize(
+    "dataset", [lf("mimicgen_dataset"), lf("nuscenes_dataset"), lf("yaak_dataset")]
+)
+@pytest.mark.parametrize(
+    "options",
+    [
+        {"max_stream_workers": 2},
+        {"source_cache": SourceCacheConfig(maxsize=1)},
+        {"source_cache": SourceCacheConfig(maxsize=1), "max_stream_workers": 4},
+        {"source_cache": SourceCacheConfig(maxsize=1, weight=SourceCacheWeight.nbytes)},
+        {"tensor_cache": {"maxsize": 2**30}},
+        {"encode_meta": True},
+        {"metrics": True},
+    ],
+    ids=[
+        "max_stream_workers",
+        "source_cache",
+        "source_cache_concurrent",
+        "source_cache_nbytes",
+        "tensor_cache",
+        "encode_meta",
+        "metrics",
+    ],
+)
+def test_options(dataset: Dataset, options: dict[str, Any], tmp_path: Path) -> None:
+    kwargs = dict(options)
+    if (tensor_cache := options.get("tensor_cache")) is not None:
+        kwargs["tensor_cache"] = TensorCacheConfig(
+            path=tmp_path / "cache", **tensor_cache
+        )
+
+    dataset_options = Dataset(
+        data=dataset.data, meta=dataset.meta, streams=dataset.streams, **kwargs
+    )
+    index = [0, 2, 1]
+    expected = dataset.get_batch(index)
+
+    # twice, so that caches are both filled and hit
+    for _ in range(2):
+        assert_batch_equal(dataset_options, dataset_options.get_batch(index), expected)
+
+    match kwargs:
+        case {"source_cache": SourceCacheConfig(weight=SourceCacheWeight.nbytes)}:
+            # sources larger than the cache are closed after each read instead
+            info = dataset_options.source_cache_info
+            assert info is not None
+            assert info.currsize == info.evictions == 0
+
+        case {"source_cache": _}:
+            info = dataset_options.source_cache_info
+            assert info is not None
+            assert info.evictions > 0
+            assert info.currsize <= 1
+
+        case {"tensor_cache": TensorCacheConfig() as tensor_cache}:
+            info = dataset_options.tensor_cache_info
+            assert info is not None
+            assert info.hits == info.misses > 0
+            assert 0 < info.currsize <= info.maxsize
+
+            assert_tensor_cache_size(dataset, tensor_cache, info, index)
+
+        case {"metrics": True}:
+            assert dataset.collect_metrics() is None
+            assert_metrics(dataset_options, index)
+
+        case _:
+            pass
+
+    # concurrent batches sharing (and evicting) sources and caches
+    async def get_batches() -> list[Batch]:
+        return await asyncio.gather(
+            *(dataset_options.aget_batch(index) for _ in range(8))
+        )
+
+    for batch in asyncio.run(get_batches()):
+        assert_batch_equal(dataset_options, batch, expected)
+
+
+@pytest.mark.parametrize("name", ["mimicgen", "zod"])
+def test_sample_cache(
+    name: str,
+    tmp_path: Path,
+    build_dataset: Callable[[str, Sequence[str]], Dataset],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    overrides = [f"+dataset.sample_cache.path={tmp_path}"]
+    dataset = build_dataset(name, overrides)
+    assert len(list(tmp_path.iterdir())) == 1
+
+    assert dataset == build_dataset(name, overrides)
+    assert len(list(tmp_path.iterdir())) == 1
+
+    # the rbyte version and the code of pipeline targets are part of the key
+    getsource = inspect.getsource
+    for target, value in (
+        ("rbyte.dataset.version", lambda _: "0.0.0"),
+        ("inspect.getsource", lambda obj: f"{getsource(obj)}\n"),
+    ):
+        entries = set(tmp_path.iterdir())
+        monkeypatch.setattr(target, value)
+        build_dataset(name, overrides)
+        assert len(set(tmp_path.iterdir()) - entries) == 1
+
+
+@pytest.mark.parametrize("dataset", [lf("nuscenes_dataset"), lf("yaak_dataset")])
+def test_export_streams(dataset: Dataset, tmp_path: Path) -> None:
+    index = [0, 2, 1]
+    dataset_exported = dataset.export_streams(tmp_path, max_workers=2, chunk_size=2)
+
+    assert dataset.streams is not None
+    assert dataset_exported.streams is not None
+    assert dataset_exported.streams.keys() == dataset.streams.keys()
+    assert (dataset.get_batch(index) == dataset_exported.get_batch(index)).all()
+
+
+@pytest.mark.parametrize(
+    "dataset", [lf("mimicgen_dataset"), lf("nuscenes_dataset"), lf("yaak_dataset")]
+)
+def test_get_batch_order(dataset: Dataset) -> None:
+    index = [1, 1, 0, 2]
+    batch = dataset.get_batch(index, include_meta=False)
+
+    for i, sample in zip(index, batch.data, strict=True):
+        assert (sample == dataset.get_batch([i], include_meta=False).data[0]).all()
+
+
+@pytest.mark.parametrize(
+    "dataset", [lf("mimicgen_dataset"), lf("nuscenes_dataset"), lf("yaak_dataset")]
+)
+def test_get_batch_copies(dataset: Dataset) -> None:
+    dataset = Dataset(
+        data=dataset.data, meta=dataset.meta, streams=dataset.streams, encode_meta=True
+    )
+    data, input_id_codes = dataset.data.clone(), dataset.input_id_codes.clone()
+
+    # batches never share storage with the dataset, whatever their index
+    for index in (slice(0, 2), range(2), [0, 1]):
+        batch = dataset.get_batch(index)
+        assert isinstance(batch.meta, EncodedBatchMeta)
+        batch.data.zero_()
+        batch.meta.input_id.zero_()
+
+    assert (dataset.data == data).all()
+    assert torch.equal(dataset.input_id_codes, input_id_codes)
+
+
+@pytest.mark.parametrize("dataset", [lf("nuscenes_dataset"), lf("yaak_dataset")])
+def test_get_batch_reads(dataset: Dataset, monkeypatch: pytest.MonkeyPatch) -> None:
+    reads: dict[tuple[str, str], list[list[int]]] = defaultdict(list)
+    read_source = Dataset._read_source  # noqa: SLF001
+
+    def read_source_recorded(
+        self: Dataset, stream_id: str, input_id: str, indexes: Sequence[int]
+    ) -> Tensor:
+        reads[stream_id, input_id].append(list(indexes))
+        return read_source(self, stream_id, input_id, indexes)
+
+    monkeypatch.setattr(Dataset, "_read_source", read_source_recorded)
+
+    index = [1, 1, 0, 2]
+    data = dataset.get_batch(index, include_streams=False).data
+    meta = dataset.meta[index]
+    dataset.get_batch(index)
+
+    assert dataset.streams is not None
+
+    # a single read per (stream, input), of its deduplicated and sorted indexes
+    expected: dict[tuple[str, str], list[list[int]]] = {}
+    for stream_id, stream in dataset.streams.items():
+        indexes = cast(Tensor, data[stream.index])
+        for input_id in meta["input_id"].unique():
+            positions = (meta["input_id"] == input_id).arg_true().to_list()
+            expected[stream_id, input_id] = [indexes[positions].unique().tolist()]
+
+    assert reads == expected
+
+
+@pytest.mark.parametrize("dataset", [lf("mimicgen_dataset"), lf("yaak_dataset")])
+def test_filter(dataset: Dataset) -> None:
+    view = dataset.filter(pl.int_range(pl.len()) % 2 == 0)
+
+    assert len(view) == len(range(0, len(dataset), 2))
+    assert view.meta.equals(dataset.meta[::2])
+    assert (view.get_batch([1, 0]).data == dataset.get_batch([2, 0]).data).all()
+    assert dill.pickles(view, exact=True, safe=True)
+
+    view_nested = view.filter(pl.int_range(pl.len()) == 1)
+    assert (view_nested[0].data == dataset[2].data).all()
+
+
+@pytest.mark.parametrize("dataset", [lf("nuscenes_dataset"), lf("yaak_dataset")])
+def test_aget_batch(dataset: Dataset) -> None:
+    indexes = [[0, 2, 1], [1], [2, 0]]
+
+    async def get_batches() -> list[Batch]:
+        return await asyncio.gather(*(dataset.aget_batch(index) for index in indexes))
+
+    for index, batch in zip(indexes, asyncio.run(get_batches()), strict=True):
+        assert (batch == dataset.get_batch(index)).all()
@@ -1,9 +1,25 @@
+import shutil
+from collections import defaultdict
+from functools import partial
+from operator import attrgetter
 from pathlib import Path
 
 import polars as pl
+import polars.selectors as cs
+import pytest
+import simplejpeg
+from mcap.reader import make_reader
+from mcap.records import Schema
 from polars.testing import assert_frame_equal
 
-from rbyte.io import PathDataFrameBuilder, YaakMetadataDataFrameBuilder
+from rbyte.io import (
+    JsonMcapDecoderFactory,
+    McapDataFrameBuilder,
+    McapTensorSource,
+    PathDataFrameBuilder,
+    ProtobufMcapDecoderFactory,
+    YaakMetadataDataFrameBuilder,
+)
 
 DATA_DIR = Path(__file__).resolve().parent / "data"
 CAMERA_ENUM = pl.Enum(
@@ -113,3 +129,145 @@ def test_YaakMetadataDataFrameBuilder() -> None:  # noqa: N802
         case _:
             msg = "unexpected dataframe schemas"
             raise AssertionError(msg)
+
+
+def test_McapTensorSource(tmp_path: Path) -> None:  # noqa: N802
+    path = tmp_path / "scene.mcap"
+    shutil.copy(DATA_DIR / "nuscenes" / "nuScenes-v1.0-mini-scene-0061-cut.mcap", path)
+    kwargs = {
+        "path": path,
+        "topic": "/CAM_FRONT/image_rect_compressed",
+        "decoder_factory": "mcap_protobuf.decoder.DecoderFactory",
+        "decoder": partial(simplejpeg.decode_jpeg, colorspace="rgb"),
+    }
+
+    source = McapTensorSource(**kwargs)  # ty: ignore[invalid-argument-type]
+    tensor = source[0]
+    assert source.chunk_cache_info.currsize == 0
+
+    # chunks are only cached across calls on request
+    source = McapTensorSource(chunk_cache_size="64MiB", **kwargs)  # ty: ignore[invalid-argument-type]
+    assert (source[0] == tensor).all()
+    misses = source.chunk_cache_info.misses
+    assert source.resources.nbytes == path.stat().st_size + (
+        source.chunk_cache_info.currsize
+    )
+
+    # the chunk is decompressed once
+    assert (source[[0, 1]][0] == tensor).all()
+    assert (source[0] == tensor).all()
+    assert source.chunk_cache_info.misses <= misses + 1
+    assert source.chunk_cache_info.hits >= 2  # noqa: PLR2004
+
+    # the message index is only persisted on request, never next to the file
+    assert not list(tmp_path.glob("*.idx.npy"))
+    index_dir = tmp_path / "index"
+    McapTensorSource(index_dir=index_dir, **kwargs)[0]  # ty: ignore[invalid-argument-type]
+    assert len(list(index_dir.glob("scene.mcap.*.idx.npy"))) == 1
+    source_reopened = McapTensorSource(index_dir=index_dir, **kwargs)  # ty: ignore[invalid-argument-type]
+    assert len(source_reopened) == len(source)
+    assert (source_reopened[0] == tensor).all()
+
+
+def build_mcap_dataframes_per_message(
+    path: Path, fields: dict[str, dict[str, pl.DataType | None]]
+) -> dict[str, pl.DataFrame]:
+    # one frame per decoded message, as McapDataFrameBuilder used to build them
+    special = {"log_time", "publish_time"}
+    rows: dict[str, list[pl.DataFrame]] = defaultdict(list)
+    with path.open("rb") as f:
+        reader = make_reader(
+            f,
+            decoder_factories=[ProtobufMcapDecoderFactory(), JsonMcapDecoderFactory()],
+        )
+        for _, channel, message, decoded in reader.iter_decoded_messages(fields.keys()):
+            topic_fields = fields[channel.topic]
+            df_schema = {k: v for k, v in topic_fields.items() if v is not None}
+            message_fields = [k for k in topic_fields if k not in special]
+            special_fields = [k for k in topic_fields if k in special]
+
+            row = pl.DataFrame({
+                field: [getattr(message, field)] for field in special_fields
+            })
+            if message_fields:
+                match decoded:
+                    case pl.DataFrame():
+                        message_row = decoded.unnest(cs.struct(), separator=".").select(
+                            message_fields
+                        )
+
+                    case _:
+                        message_row = pl.DataFrame({
+                            field: [attrgetter(field)(decoded)]
+                            for field in message_fields
+                        })
+
+                row = message_row.hstack(row)
+
+            rows[channel.topic].append(row.cast(df_schema))  # ty: ignore[invalid-argument-type]
+
+    return {topic: pl.concat(dfs) for topic, dfs in rows.items()}
+
+
+@pytest.mark.parametrize(
+    ("path", "fields"),
+    [
+        (
+            DATA_DIR / "yaak" / "Niro098-HQ" / "2024-06-18--13-39-54" / "ai.mcap",
+            {
+                "/ai/safety_score": {
+                    "clip.end_timestamp": pl.Datetime("us"),
+                    "score": pl.Float32(),
+                }
+            },
+        ),
+        (
+            DATA_DIR / "nuscenes" / "nuScenes-v1.0-mini-scene-0061-cut.mcap",
+            {
+                **{
+                    f"/{camera}/image_rect_compressed": {"log_time": pl.Datetime("ns")}
+                    for camera in ("CAM_FRONT", "CAM_FRONT_LEFT", "CAM_FRONT_RIGHT")
+                },
+                "/odom": {"log_time": pl.Datetime("ns"), "vel.x": None},
+            },
+        ),
+    ],
+)
+def test_McapDataFrameBuilder(  # noqa: N802
+    path: Path, fields: dict[str, dict[str, pl.DataType | None]]
+) -> None:
+    builder = McapDataFrameBuilder(
+        decoder_factories=[ProtobufMcapDecoderFactory, JsonMcapDecoderFactory],
+        fields=fields,
+    )
+
+    dfs = builder(path)
+    expected = build_mcap_dataframes_per_message(path, fields)
+
+    # same columns, dtypes and row order as the per-message build
+    assert dfs.keys() == expected.keys()
+    for topic, df in dfs.items():
+        assert df.schema == expected[topic].schema
+        assert_frame_equal(df, expected[topic])
+
+
+def test_JsonMcapDecoderFactory() -> None:  # noqa: N802
+    factory = JsonMcapDecoderFactory()
+    schema = Schema(id=1, name="schema", encoding="jsonschema", data=b"{}")
+    decoder = factory.decoder_for("json", schema)
+    batch_decoder = factory.batch_decoder_for("json", schema)
+    assert decoder is not None
+    assert batch_decoder is not None
+
+    messages = [b'{"a": 1, "b": "x"}', b'{"a": 2, "b": "y"}']
+    assert_frame_equal(
+        batch_decoder(messages), pl.concat([decoder(message) for message in messages])
+    )
+
+    # fields appearing, and types widening, beyond the first 100 messages
+    messages = [b'{"a": 1}'] * 150 + [b'{"a": 1.5, "b": "x"}']
+    assert_frame_equal(
+        batch_decoder(messages),
+        pl.concat([decoder(message) for message in messages], how="diagonal_relaxed"),
+    )
+    assert batch_decoder([]).is_empty()